@@ -0,0 +1,202 @@
+import argparse
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import degrees
+from snapshot import snapshot_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time degrees.py on a synthetic people/movies/stars dataset."
+    )
+    parser.add_argument("--people", type=int, default=20000)
+    parser.add_argument("--movies", type=int, default=10000)
+    parser.add_argument("--alpha", type=float, default=2.2,
+                        help="power-law exponent of cast sizes (default: 2.2)")
+    parser.add_argument("--max-cast", type=int, default=60)
+    parser.add_argument("--popularity", type=float, default=0.8,
+                        help="power-law exponent of how often people are cast "
+                             "(default: 0.8)")
+    parser.add_argument("--queries", type=int, default=50,
+                        help="number of seeded source/target pairs (default: 50)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--algorithm", nargs="+", default=["bfs", "bidir", "astar"],
+                        choices=["bfs", "bidir", "astar"])
+    parser.add_argument("--directory",
+                        help="write the dataset here and keep it "
+                             "(default: a temporary directory)")
+    args = parser.parse_args()
+
+    if args.directory:
+        os.makedirs(args.directory, exist_ok=True)
+        run(args, args.directory)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            run(args, directory)
+
+
+def run(args, directory):
+    """
+    Generate the dataset in `directory` and print timings for it.
+    """
+    stars = generate(directory, args.people, args.movies, args.alpha,
+                     args.max_cast, args.popularity, args.seed)
+    print(f"Dataset: {args.people} people, {args.movies} movies, {stars} stars")
+
+    # Loading
+    elapsed = timed(lambda: degrees.load_data(directory))
+    report("load_data", elapsed, f"{stars / elapsed:,.0f} stars/s")
+    reset()
+    elapsed = timed(lambda: degrees.stream_data(directory))
+    report("stream_data", elapsed, f"{stars / elapsed:,.0f} stars/s")
+    reset()
+    try:
+        elapsed = timed(lambda: degrees.load_data(directory, cache=True))
+        report("load_data (cache write)", elapsed, f"{stars / elapsed:,.0f} stars/s")
+        reset()
+        elapsed = timed(lambda: degrees.load_data(directory, cache=True))
+        report("load_data (cache read)", elapsed, f"{stars / elapsed:,.0f} stars/s")
+    finally:
+        if os.path.exists(snapshot_path(directory)):
+            os.remove(snapshot_path(directory))
+    reset()
+    degrees.load_data(directory)
+
+    # Neighbors
+    rng = random.Random(args.seed)
+    person_ids = list(degrees.people)
+    sample = [rng.choice(person_ids) for _ in range(1000)]
+    elapsed = timed(lambda: [degrees.neighbors_for_person(p) for p in sample])
+    report("neighbors_for_person", elapsed, f"{len(sample) / elapsed:,.0f} calls/s")
+
+    # Searches over the same seeded pairs of people with at least one movie
+    cast = [p for p in person_ids if degrees.people[p]["movies"]]
+    pairs = [
+        (rng.choice(cast), rng.choice(cast))
+        for _ in range(args.queries)
+    ]
+    searches = {
+        "bfs": degrees.shortest_path,
+        "bidir": degrees.bidirectional_path,
+        "astar": degrees.astar_path,
+    }
+    if "astar" in args.algorithm:
+        elapsed = timed(lambda: degrees.landmarks.build(degrees.graph, 16))
+        report("landmarks (k=16)", elapsed, "")
+    for name in args.algorithm:
+        search = searches[name]
+        elapsed = timed(lambda: [search(a, b) for a, b in pairs])
+        explored = count_explored(search, pairs)
+        report(f"{name} x {len(pairs)}", elapsed,
+               f"{explored / elapsed:,.0f} nodes explored/s, "
+               f"{explored / len(pairs):,.0f} per query")
+
+    print(f"Peak RSS: {peak_rss() / 2 ** 20:,.1f} MiB")
+
+
+def generate(directory, num_people, num_movies, alpha, max_cast, popularity, seed):
+    """
+    Write people.csv, movies.csv and stars.csv to `directory` and
+    return the number of stars written.
+
+    Cast sizes follow a power law with exponent `alpha`, from 2 up to
+    `max_cast`, and the i-th most popular person is cast with weight
+    proportional to i ** -popularity, so that a few appear in many movies.
+    """
+    rng = random.Random(seed)
+    with open(os.path.join(directory, "people.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for i in range(num_people):
+            writer.writerow([i, f"Person {i}", rng.randint(1900, 2005)])
+
+    with open(os.path.join(directory, "movies.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for i in range(num_movies):
+            writer.writerow([i, f"Movie {i}", rng.randint(1920, 2020)])
+
+    # Cumulative popularity weights for choosing cast members
+    weights = []
+    total = 0
+    for i in range(num_people):
+        total += (i + 1) ** -popularity
+        weights.append(total)
+    order = list(range(num_people))
+    rng.shuffle(order)
+
+    stars = 0
+    with open(os.path.join(directory, "stars.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie in range(num_movies):
+            cast_size = min(max_cast, int(2 * rng.paretovariate(alpha - 1)))
+            cast = set(rng.choices(order, cum_weights=weights, k=cast_size))
+            for person in cast:
+                writer.writerow([person, movie])
+            stars += len(cast)
+    return stars
+
+
+def count_explored(search, pairs):
+    """
+    Returns the number of people expanded by `search` over `pairs`,
+    counted in a separate, untimed run.
+    """
+    graph = degrees.graph
+    count = 0
+    neighbors = graph.neighbors
+
+    def counting(person):
+        nonlocal count
+        count += 1
+        return neighbors(person)
+
+    graph.neighbors = counting
+    try:
+        for a, b in pairs:
+            search(a, b)
+    finally:
+        del graph.neighbors
+    return count
+
+
+def timed(function):
+    """
+    Returns the wall time in seconds taken to call `function`.
+    """
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def reset():
+    """
+    Forget everything loaded into the degrees module.
+    """
+    degrees.names = {}
+    degrees.people = {}
+    degrees.movies = {}
+    degrees.name_index.names = degrees.names
+
+
+def report(label, elapsed, detail):
+    print(f"  {label:<24} {elapsed:10.3f}s  {detail}")
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,325 @@
+import argparse
 import csv
+import gc
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
 import sys
+import tempfile
+from array import array
 
-from util import Node, StackFrontier, QueueFrontier
+from graph import CoStarGraph
+from landmarks import LandmarkIndex
+from nameindex import NameIndex
+from snapshot import index_sections, read_snapshot, tables, write_snapshot
+from util import Node, StackFrontier, QueueSetFrontier
 
-# Maps names to a set of corresponding person_ids
+# Fields of people.csv and movies.csv kept as string columns, and their sections
+PERSON_COLUMNS = {"id": "person_ids", "name": "person_names", "birth": "person_births"}
+MOVIE_COLUMNS = {"id": "movie_ids", "title": "movie_titles", "year": "movie_years"}
+
+# Landmarks indexed when astar_path or estimate_distance needs them first
+LANDMARKS = 16
+
+# Maps names to a set of corresponding person_ids (read-only once loaded)
 names = {}
 
-# Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids)
+# Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids),
+# built on each lookup
 people = {}
 
-# Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
+# Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids),
+# built on each lookup
 movies = {}
 
+# Integer-indexed co-star graph searched by shortest_path
+graph = CoStarGraph()
+
+# Sorted names for prefix and fuzzy lookup, built on first use
+name_index = NameIndex(names)
+
+# Landmark distances used by estimate_distance and astar_path, built on
+# first use and dropped whenever the data is loaded again
+landmarks = LandmarkIndex()
+
 
-def load_data(directory):
+def load_data(directory, cache=False):
     """
     Load data from CSV files into memory.
+
+    Names, births, titles and years are kept as UTF-8 string columns and
+    the stars as the co-star graph's CSR arrays, so `names`, `people` and
+    `movies` are read-only mappings over those, and each person's movies
+    and each movie's stars are found from the graph on lookup.
+
+    If `cache` is true, reuse the binary snapshot written by an earlier
+    load when the CSV files are unchanged, and write one otherwise. The
+    mappings then read from the memory-mapped snapshot.
     """
-    # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
-
-    # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+    global names, people, movies, landmarks
+    landmarks = LandmarkIndex()
+    if cache:
+        loaded = read_snapshot(directory, graph)
+        if loaded is not None:
+            names, people, movies = loaded
+            name_index.names = names
+            return
+
+    sections = {}
+    person_index = read_table(f"{directory}/people.csv", PERSON_COLUMNS, sections)
+    movie_index = read_table(f"{directory}/movies.csv", MOVIE_COLUMNS, sections)
+    person_counts = array("i", [0]) * len(person_index)
+    movie_counts = array("i", [0]) * len(movie_index)
+
+    # Load stars as flat (person, movie) row pairs
+    pairs = array("i")
+    for person, movie in read_stars(directory, person_index, movie_index):
+        person_counts[person] += 1
+        movie_counts[movie] += 1
+        pairs.append(person)
+        pairs.append(movie)
+    del person_index, movie_index
+
+    # Build compact adjacency for searching
+    graph.build_streamed(person_counts, movie_counts, [pairs])
+    del pairs
+
+    index_sections(sections)
+    names, people, movies = tables(sections, graph)
+    name_index.names = names
+
+    if cache:
+        write_snapshot(directory, sections, graph)
+
+
+def stream_data(directory, chunk_bytes=64 * 2 ** 20, skip_isolated=True):
+    """
+    Load data from CSV files straight into compact tables, without
+    keeping a dictionary or set per person or movie.
+
+    Names, births, titles and years are stored as UTF-8 string columns,
+    and (person, movie) pairs are spilled to a temporary file in chunks
+    of at most `chunk_bytes` bytes, then replayed chunk by chunk into
+    the graph's adjacency arrays. `names`, `people` and `movies` are
+    then read-only mappings over those, as after loading a snapshot.
+
+    Only the pairs are limited by `chunk_bytes`: the dictionaries
+    mapping ids to rows are held while stars.csv is read.
+
+    If `skip_isolated` is true, people with no movies and movies with
+    no stars are left out.
+    """
+    global names, people, movies, landmarks
+    landmarks = LandmarkIndex()
+    sections = {}
+    person_index = read_table(f"{directory}/people.csv", PERSON_COLUMNS, sections)
+    movie_index = read_table(f"{directory}/movies.csv", MOVIE_COLUMNS, sections)
+    person_counts = array("i", [0]) * len(person_index)
+    movie_counts = array("i", [0]) * len(movie_index)
+
+    # Two int32 values per pair
+    chunk_size = max(2, chunk_bytes // 4 // 2 * 2)
+
+    with tempfile.TemporaryFile() as spill:
+
+        # First pass: count stars and spill them as integer pairs
+        buffer = array("i")
+        for person, movie in read_stars(directory, person_index, movie_index):
+            person_counts[person] += 1
+            movie_counts[movie] += 1
+            buffer.append(person)
+            buffer.append(movie)
+            if len(buffer) >= chunk_size:
+                buffer.tofile(spill)
+                del buffer[:]
+        buffer.tofile(spill)
+        del buffer, person_index, movie_index
+
+        person_remap = movie_remap = None
+        if skip_isolated:
+            person_counts, person_remap = drop_isolated(person_counts)
+            movie_counts, movie_remap = drop_isolated(movie_counts)
+            keep_rows(sections, PERSON_COLUMNS.values(), person_remap)
+            keep_rows(sections, MOVIE_COLUMNS.values(), movie_remap)
+
+        # Second pass: replay the spilled pairs into the adjacency arrays
+        spill.seek(0)
+        graph.build_streamed(
+            person_counts, movie_counts,
+            read_spilled(spill, chunk_size, person_remap, movie_remap)
+        )
+
+    index_sections(sections)
+    names, people, movies = tables(sections, graph)
+    name_index.names = names
+
+
+def read_table(filename, columns, sections):
+    """
+    Reads a CSV file with an "id" column into string columns, adding
+    the offsets and UTF-8 bytes of each field in `columns` to `sections`
+    under the section name it maps to. Rows repeating an earlier id are
+    skipped.
+
+    Returns a dictionary mapping each id to its row.
+    """
+    index = {}
+    data = {field: (array("q", [0]), bytearray()) for field in columns}
+    with open(filename, encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
+            if row["id"] in index:
+                continue
+            index[row["id"]] = len(index)
+            for field, (offsets, values) in data.items():
+                values.extend(row[field].encode("utf-8"))
+                offsets.append(len(values))
+    for field, name in columns.items():
+        sections[f"{name}_offsets"], sections[name] = data[field]
+    return index
 
-    # Load stars
+
+def read_stars(directory, person_index, movie_index):
+    """
+    Yields (person, movie) row pairs from stars.csv, skipping rows whose
+    person or movie is not in the index dictionaries.
+    """
     with open(f"{directory}/stars.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+            person = person_index.get(row["person_id"])
+            movie = movie_index.get(row["movie_id"])
+            if person is not None and movie is not None:
+                yield person, movie
+
+
+def drop_isolated(counts):
+    """
+    Returns the non-zero counts and an array mapping old indices to
+    new ones (-1 for dropped ones).
+    """
+    kept_counts = array("i")
+    remap = array("i", [-1]) * len(counts)
+    for i, count in enumerate(counts):
+        if count:
+            remap[i] = len(kept_counts)
+            kept_counts.append(count)
+    return kept_counts, remap
+
+
+def keep_rows(sections, names, remap):
+    """
+    Replaces each string column named in `names` with only the rows
+    that `remap` keeps.
+    """
+    for name in names:
+        offsets, values = sections[f"{name}_offsets"], sections[name]
+        kept_offsets = array("q", [0])
+        kept = bytearray()
+        for row, new_row in enumerate(remap):
+            if new_row != -1:
+                kept.extend(values[offsets[row]:offsets[row + 1]])
+                kept_offsets.append(len(kept))
+        sections[f"{name}_offsets"], sections[name] = kept_offsets, kept
+
+
+def read_spilled(spill, chunk_size, person_remap=None, movie_remap=None):
+    """
+    Yields flat arrays of (person, movie) pairs read back from `spill`,
+    `chunk_size` values at a time, renumbered through the remap arrays
+    if given.
+    """
+    while True:
+        chunk = array("i")
+        try:
+            chunk.fromfile(spill, chunk_size)
+        except EOFError:
+            pass
+        if not chunk:
+            return
+        if person_remap is not None:
+            chunk[0::2] = array("i", (person_remap[person] for person in chunk[0::2]))
+            chunk[1::2] = array("i", (movie_remap[movie] for movie in chunk[1::2]))
+        yield chunk
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find the degrees of separation between two people."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--algorithm", choices=["bfs", "bidir", "astar"], default="bfs",
+                        help="search used to find the path (default: bfs)")
+    parser.add_argument("--landmarks", type=int, default=LANDMARKS, metavar="K",
+                        help="landmarks indexed for the astar search (default: 16)")
+    parser.add_argument("--policy", choices=["ask", "most-connected", "none"],
+                        help="how to pick between people with the same name "
+                             "(default: ask, or none with --batch)")
+    parser.add_argument("--max-distance", type=int, default=0, metavar="N",
+                        help="match names up to N edits away when there is "
+                             "no exact match (default: 0)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse the CSV files instead of using a snapshot")
+    parser.add_argument("--stream", action="store_true",
+                        help="load into compact tables, spilling star pairs "
+                             "to a temporary file")
+    parser.add_argument("--chunk-size", type=int, default=64, metavar="MB",
+                        help="size of the star pair chunks spilled and replayed "
+                             "by --stream (default: 64)")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer tab-separated name or id pairs from FILE "
+                             "('-' for stdin) as JSON lines")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes used by --batch (default: CPU count)")
+    args = parser.parse_args()
+    directory = args.directory
+    search = {
+        "bfs": shortest_path,
+        "bidir": bidirectional_path,
+        "astar": astar_path,
+    }[args.algorithm]
+
+    if args.batch is not None:
+        print("Loading data...", file=sys.stderr)
+        load(directory, args)
+        print("Data loaded.", file=sys.stderr)
+        if args.algorithm == "astar":
+            landmarks.build(graph, args.landmarks)
+        policy = args.policy or "none"
+        if policy == "ask":
+            sys.exit("--policy ask cannot be used with --batch")
+        options = (search, policy, args.max_distance)
+        if args.batch == "-":
+            run_batch(read_queries(sys.stdin, *options), sys.stdout, args.workers)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                run_batch(read_queries(f, *options), sys.stdout, args.workers)
+        return
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load(directory, args)
     print("Data loaded.")
+    if args.algorithm == "astar":
+        landmarks.build(graph, args.landmarks)
 
-    source = person_id_for_name(input("Name: "))
+    policy = args.policy or "ask"
+    source = person_id_for_name(input("Name: "), policy, args.max_distance)
     if source is None:
         sys.exit("Person not found.")
-    target = person_id_for_name(input("Name: "))
+    target = person_id_for_name(input("Name: "), policy, args.max_distance)
     if target is None:
         sys.exit("Person not found.")
-    path = shortest_path(source, target)
-    
+    if landmarks.landmarks:
+        bounds = estimate_distance(source, target)
+        if bounds is None:
+            print("Estimate: not connected.")
+        elif bounds[1] is not None:
+            print(f"Estimate: {bounds[0]} to {bounds[1]} degrees of separation.")
+    path = search(source, target)
+
     if path is None:
         print("Not connected.")
     else:
@@ -83,6 +333,80 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
+def load(directory, args):
+    """
+    Load data with the loader chosen by the command-line arguments.
+    """
+    if args.stream:
+        stream_data(directory, chunk_bytes=args.chunk_size * 2 ** 20)
+    else:
+        load_data(directory, cache=not args.no_cache)
+
+
+def read_queries(lines, search, policy="none", max_distance=0):
+    """
+    Yields (search, source, target, policy, max_distance) queries from
+    tab-separated lines of names or IMDB ids, skipping blank lines.
+    """
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        source, _, target = line.partition("\t")
+        yield search, source.strip(), target.strip(), policy, max_distance
+
+
+def run_batch(queries, output, workers):
+    """
+    Answers queries from `read_queries`, writing one JSON line per
+    query to `output` in input order.
+
+    With more than one worker, searches are spread over a pool of forked
+    processes that share the loaded data copy-on-write.
+    """
+    if workers <= 1:
+        for result in map(answer_query, queries):
+            output.write(json.dumps(result) + "\n")
+        return
+
+    # Keep the loaded data out of the collector so children don't touch its pages
+    gc.freeze()
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        for result in pool.imap(answer_query, queries, chunksize=64):
+            output.write(json.dumps(result) + "\n")
+
+
+def answer_query(query):
+    """
+    Returns a JSON-serialisable result for a query from `read_queries`,
+    where source and target are names or IMDB ids.
+    """
+    search, source, target, policy, max_distance = query
+    result = {"source": source, "target": target}
+    source_id = resolve_person(source, policy, max_distance)
+    target_id = resolve_person(target, policy, max_distance)
+    if source_id is None or target_id is None:
+        result["error"] = "person not found or ambiguous"
+        return result
+
+    path = search(source_id, target_id)
+    result["source_id"] = source_id
+    result["target_id"] = target_id
+    result["degrees"] = None if path is None else len(path)
+    result["path"] = path
+    return result
+
+
+def resolve_person(token, policy="none", max_distance=0):
+    """
+    Returns the IMDB id for `token`, which may be an id or a name,
+    resolving names with `person_id_for_name`.
+    """
+    if token in people:
+        return token
+    return person_id_for_name(token, policy, max_distance)
+
+
 def shortest_path(source, target):
     """
     Returns the shortest list of (movie_id, person_id) pairs
@@ -90,10 +414,14 @@ def shortest_path(source, target):
 
     If no possible path, returns None.
     """
+    if source == target:
+        return []
+    source = graph.person_index[source]
+    target = graph.person_index[target]
     num_explored = 0
-    
+
     start = Node(state=source, parent=None, action=None)
-    frontier = QueueFrontier()
+    frontier = QueueSetFrontier()
     frontier.add(start)
     
     explored = set()
@@ -109,7 +437,7 @@ def shortest_path(source, target):
         explored.add(node.state)
 
         # Add neighbors to frontier
-        for movie, person in neighbors_for_person(node.state):
+        for movie, person in graph.neighbors(node.state):
             if not frontier.contains_state(person) and person not in explored:
                 child = Node(state=person, parent=node, action=movie)
                 if child.state == target:
@@ -122,20 +450,247 @@ def shortest_path(source, target):
                     actions.reverse()
                     cells.reverse()
                     solution = list(zip(actions, cells))
-                    return solution
+                    return graph.path_ids(solution)
                 frontier.add(child)
         
         
 
-def person_id_for_name(name):
+def shortest_paths(source, target, key=None, k=None):
+    """
+    Yields every shortest list of (movie_id, person_id) pairs that
+    connects the source to the target, lazily, from one breadth-first
+    search.
+
+    If `key` is given, it maps a movie_id to a number and paths are
+    yielded in increasing order of the sum of `key` over their movies,
+    e.g. `key=lambda movie_id: -int(movies[movie_id]["year"])` for the
+    most recent connections first. At most `k` paths are yielded if
+    given.
+    """
+    source = graph.person_index[source]
+    target = graph.person_index[target]
+    dag = graph.shortest_path_dag(source, target)
+    if dag is None:
+        return
+    if key is None:
+        paths = enumerate_dag_paths(dag, source, target)
+    else:
+        paths = rank_dag_paths(dag, source, target, key)
+    for path in itertools.islice(paths, k):
+        yield graph.path_ids(path)
+
+
+def enumerate_dag_paths(dag, source, target):
+    """
+    Yields the (movie, person) index paths from `source` to `target`
+    through a shortest-path DAG, depth first.
+    """
+    stack = [(target, [])]
+    while stack:
+        person, suffix = stack.pop()
+        if person == source:
+            yield suffix[::-1]
+            continue
+        for movie, parent in dag[person]:
+            stack.append((parent, suffix + [(movie, person)]))
+
+
+def rank_dag_paths(dag, source, target, key):
+    """
+    Yields the (movie, person) index paths from `source` to `target`
+    through a shortest-path DAG in increasing order of total movie cost.
+
+    The cheapest cost from the source to every person is computed first,
+    so each partial path's priority is the exact cost of its best
+    completion and paths come off the heap in order.
+    """
+    cost = {}
+
+    def movie_cost(movie):
+        if movie not in cost:
+            cost[movie] = key(graph.movie_ids[movie])
+        return cost[movie]
+
+    # Cheapest cost from the source, visiting people in order of distance
+    best = {source: 0}
+    for person, parents in dag.items():
+        if person != source:
+            best[person] = min(
+                best[parent] + movie_cost(movie) for movie, parent in parents
+            )
+
+    counter = itertools.count()
+    heap = [(best[target], next(counter), target, 0, [])]
+    while heap:
+        _, _, person, suffix_cost, suffix = heapq.heappop(heap)
+        if person == source:
+            yield suffix[::-1]
+            continue
+        for movie, parent in dag[person]:
+            step = suffix_cost + movie_cost(movie)
+            heapq.heappush(heap, (
+                best[parent] + step, next(counter),
+                parent, step, suffix + [(movie, person)]
+            ))
+
+
+def astar_path(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, using A* search guided
+    by the landmark index.
+
+    If no possible path, returns None.
+    """
+    path = landmark_index().astar_path(
+        graph.person_index[source], graph.person_index[target]
+    )
+    return None if path is None else graph.path_ids(path)
+
+
+def estimate_distance(source, target):
+    """
+    Returns (lower, upper) bounds on the degrees of separation between
+    the source and the target from the landmark index, without
+    searching. `upper` is None if no landmark reaches them.
+
+    Returns None if the landmarks show they are not connected.
+    """
+    return landmark_index().bounds(
+        graph.person_index[source], graph.person_index[target]
+    )
+
+
+def landmark_index():
+    """
+    Returns the landmark index for the loaded graph, building it
+    with LANDMARKS landmarks if it has not been built yet.
+    """
+    if landmarks.graph is None:
+        landmarks.build(graph, LANDMARKS)
+    return landmarks
+
+
+def distances_from(source):
+    """
+    Returns the BFSTree holding the degrees of separation and a
+    parent pointer for every person connected to the source,
+    found with a single breadth-first search.
+    """
+    return graph.bfs_tree(graph.person_index[source])
+
+
+def separation_stats(source):
+    """
+    Returns the eccentricity of the source (the largest degrees of
+    separation to anyone connected to them) and a histogram whose
+    i-th entry counts the people exactly i degrees away.
+    """
+    histogram = distances_from(source).histogram()
+    return len(histogram) - 1, histogram
+
+
+def bidirectional_path(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, searching outwards
+    from both people at once until the two searches meet.
+
+    If no possible path, returns None.
+    """
+    if source == target:
+        return []
+    source = graph.person_index[source]
+    target = graph.person_index[target]
+
+    # Maps each reached person to the (movie_id, person_id) step that reached them
+    forward = {source: None}
+    backward = {target: None}
+    forward_layer = [source]
+    backward_layer = [target]
+
+    while forward_layer and backward_layer:
+
+        # Grow whichever search has the smaller frontier by one whole layer
+        if len(forward_layer) <= len(backward_layer):
+            forward_layer, meeting = expand_layer(forward_layer, forward, backward)
+        else:
+            backward_layer, meeting = expand_layer(backward_layer, backward, forward)
+
+        if meeting is not None:
+            return graph.path_ids(join_paths(meeting, forward, backward))
+
+    return None
+
+
+def expand_layer(layer, reached, other):
+    """
+    Expands every person index in `layer` by one step, recording how
+    each new person was reached in `reached`.
+
+    Returns the next layer and the first person also reached by the
+    `other` search, or None if the searches have not met.
+    """
+    next_layer = []
+    for person in layer:
+        for movie, neighbor in graph.neighbors(person):
+            if neighbor in reached:
+                continue
+            reached[neighbor] = (movie, person)
+            if neighbor in other:
+                return next_layer, neighbor
+            next_layer.append(neighbor)
+    return next_layer, None
+
+
+def join_paths(meeting, forward, backward):
+    """
+    Returns the (movie, person) index path through `meeting`
+    formed by the forward and backward search trees.
+    """
+    path = []
+    person = meeting
+    while forward[person] is not None:
+        movie, parent = forward[person]
+        path.append((movie, person))
+        person = parent
+    path.reverse()
+
+    person = meeting
+    while backward[person] is not None:
+        movie, parent = backward[person]
+        path.append((movie, parent))
+        person = parent
+    return path
+
+
+def person_id_for_name(name, policy="ask", max_distance=0):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
+
+    If there is no exact match, names within `max_distance` edits are
+    used instead, keeping only the closest ones. `policy` chooses between
+    several matching people: "ask" prompts for an id, "most-connected"
+    picks the person with the most co-star links, and "none" gives up.
     """
     person_ids = list(names.get(name.lower(), set()))
+    if len(person_ids) == 0 and max_distance > 0:
+        matches = name_index.fuzzy(name, max_distance)
+        closest = [key for distance, key in matches if distance == matches[0][0]]
+        person_ids = [
+            person_id for key in closest for person_id in names[key]
+        ]
     if len(person_ids) == 0:
         return None
     elif len(person_ids) > 1:
+        if policy == "most-connected":
+            return max(
+                person_ids,
+                key=lambda person_id: graph.co_star_count(graph.person_index[person_id])
+            )
+        if policy != "ask":
+            return None
         print(f"Which '{name}'?")
         for person_id in person_ids:
             person = people[person_id]
@@ -153,16 +708,22 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def names_with_prefix(prefix, limit=None):
+    """
+    Returns the lowercase names starting with `prefix`,
+    in sorted order and at most `limit` of them if given.
+    """
+    return name_index.prefix(prefix, limit)
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
-    movie_ids = people[person_id]["movies"]
     neighbors = set()
-    for movie_id in movie_ids:
-        for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
+    for movie, person in graph.neighbors(graph.person_index[person_id]):
+        neighbors.add((graph.movie_ids[movie], graph.person_ids[person]))
     return neighbors
 
 
@@ -0,0 +1,253 @@
+from array import array
+
+
+class CoStarGraph():
+    """
+    Co-star graph with people and movies mapped to dense integers.
+
+    Adjacency is stored as CSR offset/index arrays: the movies of
+    person `p` are `person_movies[person_offsets[p]:person_offsets[p + 1]]`
+    and the stars of movie `m` are
+    `movie_people[movie_offsets[m]:movie_offsets[m + 1]]`.
+    """
+
+    def __init__(self):
+        self.person_ids = []
+        self.movie_ids = []
+        self.person_index = {}
+        self.movie_index = {}
+        self.person_offsets = array("i", [0])
+        self.person_movies = array("i")
+        self.movie_offsets = array("i", [0])
+        self.movie_people = array("i")
+
+    def build_streamed(self, person_counts, movie_counts, chunks):
+        """
+        Fill the adjacency arrays from (person, movie) index pairs,
+        delivered by `chunks` as flat arrays [person, movie, person,
+        movie, ...], given how many pairs each person and movie appears
+        in. The ids and id lookups are left to the caller.
+
+        Only one chunk is held at a time besides the adjacency arrays
+        themselves. Repeated pairs are dropped.
+        """
+        person_offsets = offsets_for(person_counts)
+        movie_offsets = offsets_for(movie_counts)
+        person_movies = array("i", [0]) * person_offsets[-1]
+        movie_people = array("i", [0]) * movie_offsets[-1]
+        person_cursor = array("i", person_offsets)
+        movie_cursor = array("i", movie_offsets)
+        for chunk in chunks:
+            for k in range(0, len(chunk), 2):
+                person, movie = chunk[k], chunk[k + 1]
+                person_movies[person_cursor[person]] = movie
+                person_cursor[person] += 1
+                movie_people[movie_cursor[movie]] = person
+                movie_cursor[movie] += 1
+
+        self.person_offsets, self.person_movies = deduplicate(person_offsets, person_movies)
+        self.movie_offsets, self.movie_people = deduplicate(movie_offsets, movie_people)
+
+    def __len__(self):
+        return len(self.person_ids)
+
+    def neighbors(self, person):
+        """
+        Yields (movie, person) index pairs for people who starred
+        with the person at index `person`, including that person.
+        """
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_people = self.movie_people
+        for i in range(self.person_offsets[person], self.person_offsets[person + 1]):
+            movie = person_movies[i]
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                yield movie, movie_people[j]
+
+    def co_star_count(self, person):
+        """
+        Returns the number of (movie, co-star) links of the person
+        at index `person`.
+        """
+        count = 0
+        for i in range(self.person_offsets[person], self.person_offsets[person + 1]):
+            movie = self.person_movies[i]
+            count += self.movie_offsets[movie + 1] - self.movie_offsets[movie] - 1
+        return count
+
+    def bfs_tree(self, source):
+        """
+        Runs one breadth-first search from the person at index `source`
+        and returns the BFSTree of every person it reaches.
+
+        Each movie's cast is scanned at most once, so the search is
+        linear in the size of the adjacency arrays.
+        """
+        size = len(self)
+        distance = array("i", [-1]) * size
+        parent = array("i", [-1]) * size
+        via = array("i", [-1]) * size
+        expanded = bytearray(len(self.movie_ids))
+
+        person_movies = self.person_movies
+        person_offsets = self.person_offsets
+        movie_offsets = self.movie_offsets
+        movie_people = self.movie_people
+
+        distance[source] = 0
+        layer = [source]
+        depth = 0
+        while layer:
+            depth += 1
+            next_layer = []
+            for person in layer:
+                for i in range(person_offsets[person], person_offsets[person + 1]):
+                    movie = person_movies[i]
+                    if expanded[movie]:
+                        continue
+                    expanded[movie] = 1
+                    for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                        neighbor = movie_people[j]
+                        if distance[neighbor] == -1:
+                            distance[neighbor] = depth
+                            parent[neighbor] = person
+                            via[neighbor] = movie
+                            next_layer.append(neighbor)
+            layer = next_layer
+
+        return BFSTree(self, source, distance, parent, via)
+
+    def shortest_path_dag(self, source, target):
+        """
+        Runs a breadth-first search from `source` that stops after the
+        layer containing `target`, and returns a dictionary mapping each
+        person on some shortest path, in order of distance from `source`,
+        to the list of (movie, parent) pairs leading to them from the
+        previous layer.
+
+        Returns None if `target` is not reachable.
+        """
+        depth = {source: 0}
+        parents = {source: []}
+        layer = [source]
+        while layer and target not in depth:
+            next_layer = []
+            for person in layer:
+                for movie, neighbor in self.neighbors(person):
+                    if neighbor not in depth:
+                        depth[neighbor] = depth[person] + 1
+                        parents[neighbor] = []
+                        next_layer.append(neighbor)
+                    if depth[neighbor] == depth[person] + 1:
+                        parents[neighbor].append((movie, person))
+            layer = next_layer
+        if target not in depth:
+            return None
+
+        # Keep only people that lead back from the target, in search order
+        keep = set()
+        stack = [target]
+        while stack:
+            person = stack.pop()
+            if person in keep:
+                continue
+            keep.add(person)
+            stack.extend(parent for _, parent in parents[person])
+        return {person: parents[person] for person in parents if person in keep}
+
+    def path_ids(self, path):
+        """
+        Converts a list of (movie, person) index pairs into
+        (movie_id, person_id) pairs.
+        """
+        return [
+            (self.movie_ids[movie], self.person_ids[person])
+            for movie, person in path
+        ]
+
+
+class BFSTree():
+    """
+    Hop distances and parent pointers from one source person, stored
+    as arrays indexed by person. Unreachable people have distance -1.
+    """
+
+    def __init__(self, graph, source, distance, parent, via):
+        self.graph = graph
+        self.source = source
+        self.distance = distance
+        self.parent = parent
+        self.via = via
+
+    def distance_to(self, person_id):
+        """
+        Returns the degrees of separation to `person_id`,
+        or None if they are not connected to the source.
+        """
+        distance = self.distance[self.graph.person_index[person_id]]
+        return None if distance == -1 else distance
+
+    def path_to(self, person_id):
+        """
+        Returns the (movie_id, person_id) path from the source to
+        `person_id`, or None if they are not connected.
+        """
+        person = self.graph.person_index[person_id]
+        if self.distance[person] == -1:
+            return None
+        path = []
+        while person != self.source:
+            path.append((self.via[person], person))
+            person = self.parent[person]
+        path.reverse()
+        return self.graph.path_ids(path)
+
+    def reachable(self):
+        """
+        Yields (person_id, distance) for every person reached from
+        the source, including the source itself.
+        """
+        person_ids = self.graph.person_ids
+        for person, distance in enumerate(self.distance):
+            if distance != -1:
+                yield person_ids[person], distance
+
+    def histogram(self):
+        """
+        Returns a list whose i-th entry is the number of people
+        exactly i degrees from the source.
+        """
+        counts = []
+        for distance in self.distance:
+            if distance == -1:
+                continue
+            while len(counts) <= distance:
+                counts.append(0)
+            counts[distance] += 1
+        return counts
+
+
+def offsets_for(counts):
+    """
+    Returns CSR offsets for groups of the given sizes.
+    """
+    offsets = array("i", [0])
+    for count in counts:
+        offsets.append(offsets[-1] + count)
+    return offsets
+
+
+def deduplicate(offsets, indices):
+    """
+    Sorts each CSR group and removes repeated entries, compacting
+    `indices` in place. Returns the new (offsets, indices).
+    """
+    compacted = array("i", [0])
+    write = 0
+    for i in range(len(offsets) - 1):
+        group = sorted(set(indices[offsets[i]:offsets[i + 1]]))
+        indices[write:write + len(group)] = array("i", group)
+        write += len(group)
+        compacted.append(write)
+    del indices[write:]
+    return compacted, indices
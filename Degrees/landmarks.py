@@ -0,0 +1,139 @@
+import heapq
+import math
+from operator import sub
+
+# Distance byte for people a landmark does not reach; reachable distances
+# are capped one below it, which keeps them a consistent lower bound
+UNREACHED = 255
+
+
+class LandmarkIndex():
+    """
+    Degrees of separation from a few well-connected landmark people to
+    everyone else, used to bound the distance between any two people
+    via the triangle inequality.
+
+    The distances are also packed into `rows`, one byte per landmark
+    for each person, so the A* heuristic can compare two people's rows
+    without looping in Python.
+    """
+
+    def __init__(self):
+        self.graph = None
+        self.landmarks = []
+        self.distances = []
+        self.rows = b""
+
+    def build(self, graph, k):
+        """
+        Pick the `k` people with the most co-star links as landmarks and
+        run one breadth-first search from each.
+        """
+        self.graph = graph
+        self.landmarks = sorted(
+            range(len(graph)), key=lambda person: -graph.co_star_count(person)
+        )[:k]
+        self.distances = [
+            graph.bfs_tree(landmark).distance for landmark in self.landmarks
+        ]
+        k = len(self.landmarks)
+        rows = bytearray(len(graph) * k)
+        for i, distance in enumerate(self.distances):
+            rows[i::k] = bytes(
+                UNREACHED if d == -1 else min(d, UNREACHED - 1) for d in distance
+            )
+        self.rows = bytes(rows)
+
+    def bounds(self, source, target):
+        """
+        Returns (lower, upper) bounds on the degrees of separation between
+        the people at indices `source` and `target`. `upper` is None if no
+        landmark reaches both.
+
+        Returns None if some landmark reaches only one of them, which
+        means they are not connected.
+        """
+        if self.graph is None:
+            raise RuntimeError("landmark index has not been built")
+        if source == target:
+            return 0, 0
+        lower, upper = 0, None
+        for distance in self.distances:
+            to_source, to_target = distance[source], distance[target]
+            if to_source == -1 and to_target == -1:
+                continue
+            if to_source == -1 or to_target == -1:
+                return None
+            lower = max(lower, abs(to_source - to_target))
+            if upper is None or to_source + to_target < upper:
+                upper = to_source + to_target
+        return lower, upper
+
+    def astar_path(self, source, target):
+        """
+        Returns the shortest list of (movie, person) index pairs from
+        `source` to `target` using A* search, with the landmark lower
+        bound as the heuristic.
+
+        If no possible path, returns None.
+        """
+        if self.bounds(source, target) is None:
+            return None
+
+        # Landmarks that miss the target miss everyone connected to it,
+        # so both rows hold UNREACHED there and it adds nothing
+        rows, k = self.rows, len(self.landmarks)
+        to_target = rows[target * k:(target + 1) * k]
+        estimates = {}
+
+        def heuristic(person):
+            estimate = estimates.get(person)
+            if estimate is None:
+                row = rows[person * k:(person + 1) * k]
+                estimate = max(map(abs, map(sub, row, to_target)), default=0)
+                estimates[person] = estimate
+            return estimate
+
+        cost = {source: 0}
+        reached = {source: None}
+
+        # Cost each movie's cast was first expanded at; expanding it again
+        # from anyone deeper cannot lower any co-star's cost
+        expanded = {}
+
+        # Ties on estimated total are broken towards deeper nodes
+        heap = [(heuristic(source), 0, source)]
+        while heap:
+            estimate, negative_depth, person = heapq.heappop(heap)
+            depth = -negative_depth
+            if person == target:
+                return self.path(reached, target)
+            if depth > cost[person]:
+                continue
+            for movie, neighbor in self.graph.neighbors(person):
+                if expanded.setdefault(movie, depth) < depth:
+                    continue
+                if depth + 1 < cost.get(neighbor, math.inf):
+                    cost[neighbor] = depth + 1
+                    reached[neighbor] = (movie, person)
+
+                    # Nothing left on the heap can reach the target more cheaply
+                    if neighbor == target and depth + 1 <= estimate:
+                        return self.path(reached, target)
+                    heapq.heappush(
+                        heap, (depth + 1 + heuristic(neighbor), -(depth + 1), neighbor)
+                    )
+        return None
+
+    def path(self, reached, person):
+        """
+        Returns the list of (movie, person) index pairs leading to
+        `person` through the `reached` steps of a search.
+        """
+        path = []
+        while reached[person] is not None:
+            movie, parent = reached[person]
+            path.append((movie, person))
+            person = parent
+        path.reverse()
+        return path
@@ -0,0 +1,96 @@
+from bisect import bisect_left
+
+# Sorts after every character a name can contain
+HIGHEST = chr(0x10FFFF)
+
+
+class NameIndex():
+    """
+    Sorted array of the lowercase names in a `names` dictionary,
+    supporting prefix and bounded edit distance lookup.
+
+    The array is built on first use and rebuilt if names are added.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.keys = []
+
+    def sorted_keys(self):
+        """
+        Returns the sorted lowercase names, building them if needed.
+        """
+        if len(self.keys) != len(self.names):
+            self.keys = sorted(self.names)
+        return self.keys
+
+    def prefix(self, prefix, limit=None):
+        """
+        Returns the names starting with `prefix` in sorted order,
+        at most `limit` of them if given.
+        """
+        keys = self.sorted_keys()
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        stop = bisect_left(keys, prefix + HIGHEST, start)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return keys[start:stop]
+
+    def fuzzy(self, name, max_distance):
+        """
+        Returns (distance, name) pairs, closest first, for every name
+        within `max_distance` edits of `name`.
+
+        The sorted array is walked as an implicit trie: names sharing a
+        prefix with the previous one reuse its edit distance rows, and
+        once every entry of a row exceeds `max_distance` all names with
+        that prefix are skipped with a binary search.
+        """
+        keys = self.sorted_keys()
+        name = name.lower()
+        rows = [list(range(len(name) + 1))]
+        previous = ""
+        matches = []
+        i = 0
+        while i < len(keys):
+            key = keys[i]
+
+            # Keep the rows for the prefix shared with the previous name
+            shared = 0
+            limit = min(len(previous), len(key))
+            while shared < limit and previous[shared] == key[shared]:
+                shared += 1
+            del rows[shared + 1:]
+
+            pruned = False
+            for depth in range(shared, len(key)):
+                rows.append(next_row(rows[-1], key[depth], name))
+                if min(rows[-1]) > max_distance:
+                    i = bisect_left(keys, key[:depth + 1] + HIGHEST, i)
+                    pruned = True
+                    break
+
+            if not pruned:
+                if rows[-1][-1] <= max_distance:
+                    matches.append((rows[-1][-1], key))
+                i += 1
+            previous = key[:len(rows) - 1]
+
+        matches.sort()
+        return matches
+
+
+def next_row(row, char, name):
+    """
+    Returns the edit distance row for a prefix extended by `char`,
+    given the row for the prefix itself.
+    """
+    result = [row[0] + 1]
+    for j, other in enumerate(name, 1):
+        result.append(min(
+            result[j - 1] + 1,
+            row[j] + 1,
+            row[j - 1] + (char != other)
+        ))
+    return result
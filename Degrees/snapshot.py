@@ -0,0 +1,331 @@
+import itertools
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+
+# Bump whenever the layout below changes
+VERSION = 2
+
+MAGIC = b"DEGSNAP\0"
+
+# Sections of the file, in order, with the array typecode each is stored as.
+# String columns are an int64 offsets section followed by the UTF-8 bytes.
+SECTIONS = (
+    ("person_offsets", "i"), ("person_movies", "i"),
+    ("movie_offsets", "i"), ("movie_people", "i"),
+    ("person_ids_offsets", "q"), ("person_ids", "B"),
+    ("person_names_offsets", "q"), ("person_names", "B"),
+    ("person_births_offsets", "q"), ("person_births", "B"),
+    ("movie_ids_offsets", "q"), ("movie_ids", "B"),
+    ("movie_titles_offsets", "q"), ("movie_titles", "B"),
+    ("movie_years_offsets", "q"), ("movie_years", "B"),
+    ("name_keys_offsets", "q"), ("name_keys", "B"),
+
+    # Rows sorted by id, and the people with each name key
+    ("person_order", "i"), ("movie_order", "i"),
+    ("name_offsets", "i"), ("name_people", "i"),
+)
+
+# Sections holding the co-star graph's CSR arrays
+GRAPH_SECTIONS = ("person_offsets", "person_movies", "movie_offsets", "movie_people")
+
+# Magic, version, (size, mtime_ns) of each CSV file, byte length of each section
+HEADER = struct.Struct(f"<8sI4x6q{len(SECTIONS)}q")
+
+CSV_FILES = ("people.csv", "movies.csv", "stars.csv")
+
+
+class Strings():
+    """
+    Read-only sequence of strings stored as UTF-8 bytes, where string
+    `i` is `data[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.raw(i).decode("utf-8")
+
+    def raw(self, i):
+        """
+        Returns string `i` as bytes.
+        """
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+
+class IdIndex(Mapping):
+    """
+    Maps ids to their row in `ids`, by binary search over `order`, the
+    rows sorted by id.
+    """
+
+    def __init__(self, ids, order):
+        self.ids = ids
+        self.order = order
+
+    def __getitem__(self, key):
+        i = find(self.ids, key, self.order)
+        if i is None:
+            raise KeyError(key)
+        return self.order[i]
+
+    def __iter__(self):
+        return (self.ids[i] for i in range(len(self.ids)))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Records(Mapping):
+    """
+    Maps ids to dictionaries of their string columns plus `field`, the
+    set of ids linked to them in a CSR adjacency, built on each lookup.
+    """
+
+    def __init__(self, index, columns, field, offsets, values, linked_ids):
+        self.index = index
+        self.columns = columns
+        self.field = field
+        self.offsets = offsets
+        self.values = values
+        self.linked_ids = linked_ids
+
+    def __getitem__(self, key):
+        row = self.index[key]
+        record = {name: column[row] for name, column in self.columns.items()}
+        record[self.field] = {
+            self.linked_ids[value]
+            for value in self.values[self.offsets[row]:self.offsets[row + 1]]
+        }
+        return record
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class Names(Mapping):
+    """
+    Maps lowercase names, stored sorted, to the set of ids of the
+    people with that name.
+    """
+
+    def __init__(self, keys, offsets, rows, person_ids):
+        self.keys = keys
+        self.offsets = offsets
+        self.rows = rows
+        self.person_ids = person_ids
+
+    def __getitem__(self, key):
+        i = find(self.keys, key)
+        if i is None:
+            raise KeyError(key)
+        return {
+            self.person_ids[row]
+            for row in self.rows[self.offsets[i]:self.offsets[i + 1]]
+        }
+
+    def __iter__(self):
+        return (self.keys[i] for i in range(len(self.keys)))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def find(strings, key, order=None):
+    """
+    Returns the position of `key` among `strings`, which are sorted
+    (through `order`, if given), or None if it is not there.
+
+    UTF-8 preserves code point order, so the bytes are compared
+    without decoding them.
+    """
+    key = key.encode("utf-8")
+    low, high = 0, len(strings)
+    while low < high:
+        middle = (low + high) // 2
+        value = strings.raw(middle if order is None else order[middle])
+        if value < key:
+            low = middle + 1
+        elif value > key:
+            high = middle
+        else:
+            return middle
+    return None
+
+
+def snapshot_path(directory):
+    """
+    Return the path of the snapshot file kept next to `directory`.
+    """
+    directory = os.path.normpath(directory)
+    return f"{directory}.degrees-cache"
+
+
+def fingerprint(directory):
+    """
+    Return the (size, mtime_ns) pairs of the CSV files in `directory`,
+    flattened into a tuple.
+    """
+    values = []
+    for filename in CSV_FILES:
+        stat = os.stat(os.path.join(directory, filename))
+        values.extend((stat.st_size, stat.st_mtime_ns))
+    return tuple(values)
+
+
+def write_snapshot(directory, sections, graph):
+    """
+    Write `sections`, the string columns and lookup sections built by
+    `load_data`, and the CSR arrays of `graph` as the snapshot for
+    `directory`.
+
+    The file is written to a temporary name and moved into place, so
+    a concurrent reader never sees a partial snapshot. Returns False
+    if the snapshot could not be written.
+    """
+    sections = dict(sections, **{name: getattr(graph, name) for name in GRAPH_SECTIONS})
+    data = [memoryview(sections[name]).cast("B") for name, _ in SECTIONS]
+    header = HEADER.pack(
+        MAGIC, VERSION, *fingerprint(directory), *(len(values) for values in data)
+    )
+    path = snapshot_path(directory)
+    try:
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(header)
+            for values in data:
+                f.write(values)
+                f.write(bytes(padding(len(values))))
+        os.replace(f"{path}.tmp", path)
+    except OSError:
+        return False
+    return True
+
+
+def read_snapshot(directory, graph):
+    """
+    Fill `graph` from the snapshot for `directory` and return `names`,
+    `people` and `movies` mappings read from it, or None, leaving the
+    graph untouched, if there is no snapshot or it was written by a
+    different version or for different CSV files.
+
+    Every array is memory-mapped from the file and nothing is decoded
+    up front, so loading takes time independent of the data size.
+    """
+    try:
+        with open(snapshot_path(directory), "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(buffer) < HEADER.size:
+        return None
+
+    header = HEADER.unpack_from(buffer)
+    magic, version = header[:2]
+    stamp = header[2:8]
+    lengths = header[8:]
+    if magic != MAGIC or version != VERSION or stamp != fingerprint(directory):
+        return None
+
+    view = memoryview(buffer)
+    offset = HEADER.size
+    sections = {}
+    for (name, typecode), length in zip(SECTIONS, lengths):
+        sections[name] = view[offset:offset + length].cast(typecode)
+        offset += length + padding(length)
+
+    for name in GRAPH_SECTIONS:
+        setattr(graph, name, sections[name])
+    return tables(sections, graph)
+
+
+def tables(sections, graph):
+    """
+    Point `graph`'s ids and id lookups at the string columns in
+    `sections` and return `names`, `people` and `movies` mappings over
+    them and the graph's CSR arrays. `sections` holds every section but
+    the graph's, in memory or memory-mapped.
+
+    Nothing is decoded up front: ids, names and sets of movies or stars
+    are looked up on access.
+    """
+
+    def strings(name):
+        return Strings(sections[f"{name}_offsets"], sections[name])
+
+    graph.person_ids = strings("person_ids")
+    graph.movie_ids = strings("movie_ids")
+    graph.person_index = IdIndex(graph.person_ids, sections["person_order"])
+    graph.movie_index = IdIndex(graph.movie_ids, sections["movie_order"])
+
+    people = Records(
+        graph.person_index,
+        {"name": strings("person_names"), "birth": strings("person_births")},
+        "movies", graph.person_offsets, graph.person_movies, graph.movie_ids
+    )
+    movies = Records(
+        graph.movie_index,
+        {"title": strings("movie_titles"), "year": strings("movie_years")},
+        "stars", graph.movie_offsets, graph.movie_people, graph.person_ids
+    )
+    names = Names(
+        strings("name_keys"), sections["name_offsets"], sections["name_people"],
+        graph.person_ids
+    )
+    return names, people, movies
+
+
+def index_sections(sections):
+    """
+    Add the lookup sections to `sections`, which holds the string
+    columns: the person and movie rows sorted by id, and the sorted
+    lowercase names with the rows of the people who have each.
+    """
+    for table in ("person", "movie"):
+        ids = Strings(sections[f"{table}_ids_offsets"], sections[f"{table}_ids"])
+        sections[f"{table}_order"] = array("i", sorted(range(len(ids)), key=ids.raw))
+
+    person_names = Strings(sections["person_names_offsets"], sections["person_names"])
+    keys = [person_names[row].lower() for row in range(len(person_names))]
+    name_offsets = array("i", [0])
+    name_people = array("i")
+    unique = []
+    for key, rows in itertools.groupby(sorted(range(len(keys)), key=keys.__getitem__),
+                                       key=keys.__getitem__):
+        unique.append(key)
+        name_people.extend(rows)
+        name_offsets.append(len(name_people))
+    sections["name_keys_offsets"], sections["name_keys"] = encode_strings(unique)
+    sections["name_offsets"] = name_offsets
+    sections["name_people"] = name_people
+
+
+def encode_strings(values):
+    """
+    Returns int64 offsets and UTF-8 bytes for a sequence of strings.
+    """
+    offsets = array("q", [0])
+    data = bytearray()
+    for value in values:
+        data += value.encode("utf-8")
+        offsets.append(len(data))
+    return offsets, data
+
+
+def padding(size):
+    """
+    Returns the number of bytes that pad `size` to a multiple of 8.
+    """
+    return -size % 8
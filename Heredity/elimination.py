@@ -0,0 +1,266 @@
+import heapq
+import itertools
+
+from pedigree import inheritance, pass_probabilities
+
+# Number of copies of the gene a person can have
+GENES = (2, 1, 0)
+
+
+class Factor():
+    """
+    Non-negative function of some gene variables, stored as a dict
+    mapping each tuple of gene counts, in the order of `variables`, to
+    its value.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+    def __mul__(self, other):
+        """
+        Return the product of two factors over the union of their variables.
+        """
+        variables = self.variables + tuple(
+            v for v in other.variables if v not in self.variables
+        )
+        left = [variables.index(v) for v in self.variables]
+        right = [variables.index(v) for v in other.variables]
+        table = {}
+        for assignment in itertools.product(GENES, repeat=len(variables)):
+            table[assignment] = (
+                self.table[tuple(assignment[i] for i in left)] *
+                other.table[tuple(assignment[i] for i in right)]
+            )
+        return Factor(variables, table)
+
+    def __truediv__(self, other):
+        """
+        Return this factor divided by one over a subset of its variables,
+        taking 0 / 0 to be 0.
+        """
+        positions = [self.variables.index(v) for v in other.variables]
+        table = {}
+        for assignment, value in self.table.items():
+            divisor = other.table[tuple(assignment[i] for i in positions)]
+            table[assignment] = value / divisor if divisor else 0
+        return Factor(self.variables, table)
+
+    def marginal(self, variables):
+        """
+        Return the factor summed over every variable not in `variables`.
+        """
+        variables = tuple(v for v in self.variables if v in variables)
+        positions = [self.variables.index(v) for v in variables]
+        table = dict.fromkeys(itertools.product(GENES, repeat=len(variables)), 0)
+        for assignment, value in self.table.items():
+            table[tuple(assignment[i] for i in positions)] += value
+        return Factor(variables, table)
+
+    def normalized(self):
+        """
+        Return the factor scaled to sum to 1.
+        """
+        total = sum(self.table.values())
+        return Factor(self.variables, {
+            assignment: value / total for assignment, value in self.table.items()
+        })
+
+
+def unit_factor(variables):
+    """
+    Return the factor over `variables` that is 1 everywhere.
+    """
+    return Factor(variables, dict.fromkeys(
+        itertools.product(GENES, repeat=len(variables)), 1
+    ))
+
+
+def elimination_probabilities(people, probs):
+    """
+    Return gene and trait distributions for each person in `people`,
+    in the structure `normalize` leaves in `probabilities`, by exact
+    inference on a junction tree.
+
+    Only gene counts are variables: an observed trait multiplies its
+    person's gene factor by P(trait | genes), and an unobserved trait is
+    a leaf of the network, so its distribution follows from the
+    person's gene distribution. Cliques come from a min-fill
+    elimination order, so a pedigree without marriage loops only has
+    cliques of a child and its parents, and inference takes time
+    linear in the number of people.
+    """
+    factors = family_factors(people, probs)
+    order = elimination_order(people, factors)
+    cliques, parents = junction_tree(order, factors)
+    beliefs = calibrate(cliques, parents, factors)
+
+    # Each person's distribution, from the clique where they were eliminated
+    probabilities = {}
+    for person, belief in zip(order, beliefs):
+        marginal = belief.marginal((person,)).normalized()
+        genes = {g: marginal.table[(g,)] for g in GENES}
+
+        observed = people[person]["trait"]
+        if observed is None:
+            trait = {
+                value: sum(genes[g] * probs["trait"][g][value] for g in GENES)
+                for value in (True, False)
+            }
+        else:
+            trait = {value: float(value == observed) for value in (True, False)}
+        probabilities[person] = {"gene": genes, "trait": trait}
+
+    return {person: probabilities[person] for person in people}
+
+
+def family_factors(people, probs):
+    """
+    Return one factor per person: the probability of their gene count
+    given their parents' (or unconditionally, for people with no parents
+    listed), times the probability of their trait if it is known.
+    """
+    passes = pass_probabilities(probs["mutation"])
+
+    factors = []
+    for person, data in people.items():
+        emission = (
+            {g: probs["trait"][g][data["trait"]] for g in GENES}
+            if data["trait"] is not None else dict.fromkeys(GENES, 1)
+        )
+
+        if not data["mother"]:
+            table = {(g,): probs["gene"][g] * emission[g] for g in GENES}
+            factors.append(Factor((person,), table))
+            continue
+
+        table = {}
+        for g, mother, father in itertools.product(GENES, repeat=3):
+            inherit = inheritance(passes[mother], passes[father])
+            table[(g, mother, father)] = inherit[g] * emission[g]
+        factors.append(Factor((person, data["mother"], data["father"]), table))
+
+    return factors
+
+
+def elimination_order(people, factors):
+    """
+    Return an order to eliminate the people in, greedily choosing the
+    person whose elimination adds the fewest edges between their
+    neighbours (min-fill), ties broken by fewest neighbours.
+    """
+    neighbors = {person: set() for person in people}
+    for factor in factors:
+        for v in factor.variables:
+            neighbors[v].update(factor.variables)
+            neighbors[v].discard(v)
+
+    def fill(person):
+        adjacent = list(neighbors[person])
+        missing = sum(
+            1 for a, b in itertools.combinations(adjacent, 2)
+            if b not in neighbors[a]
+        )
+        return missing, len(adjacent)
+
+    # Heap of scores, with outdated entries skipped when popped
+    scores = {person: fill(person) for person in people}
+    heap = [(score, person) for person, score in scores.items()]
+    heapq.heapify(heap)
+
+    order = []
+    while heap:
+        score, person = heapq.heappop(heap)
+        if scores.get(person) != score:
+            continue
+
+        # Connect the person's neighbours to one another, then remove them
+        adjacent = neighbors.pop(person)
+        del scores[person]
+        for a, b in itertools.combinations(adjacent, 2):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+        for other in adjacent:
+            neighbors[other].discard(person)
+        order.append(person)
+
+        # Only scores of people within two steps can have changed
+        affected = set(adjacent)
+        for other in adjacent:
+            affected.update(neighbors[other])
+        for other in affected:
+            scores[other] = fill(other)
+            heapq.heappush(heap, (scores[other], other))
+
+    return order
+
+
+def junction_tree(order, factors):
+    """
+    Eliminate people in `order`, returning the clique formed by each
+    elimination and the index of each clique's parent in the tree
+    (None for roots).
+
+    The clique of a person is them plus their neighbours when they are
+    eliminated, and its parent is the clique of whichever of those
+    neighbours is eliminated next, so parents always come later in
+    `order`.
+    """
+    position = {person: i for i, person in enumerate(order)}
+    neighbors = {person: set() for person in order}
+    for factor in factors:
+        for v in factor.variables:
+            neighbors[v].update(factor.variables)
+            neighbors[v].discard(v)
+
+    cliques = []
+    parents = []
+    for person in order:
+        adjacent = neighbors[person]
+        cliques.append((person,) + tuple(sorted(adjacent, key=position.get)))
+        parents.append(min((position[p] for p in adjacent), default=None))
+        for a, b in itertools.combinations(adjacent, 2):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+        for other in adjacent:
+            neighbors[other].discard(person)
+
+    return cliques, parents
+
+
+def calibrate(cliques, parents, factors):
+    """
+    Return the belief, i.e. the unnormalised joint marginal, of every
+    clique, by passing messages up the junction tree to its roots and
+    back down again.
+
+    Messages are scaled to sum to 1 so that long pedigrees do not
+    underflow; this changes beliefs only by a constant factor.
+    """
+
+    # Attach each factor to the clique of its first-eliminated variable
+    first = {clique[0]: i for i, clique in enumerate(cliques)}
+    potentials = [unit_factor(clique) for clique in cliques]
+    for factor in factors:
+        i = min(first[v] for v in factor.variables)
+        potentials[i] = potentials[i] * factor
+
+    def separator(i):
+        return tuple(v for v in cliques[i] if v in cliques[parents[i]])
+
+    # Collect: children come before their parents in elimination order
+    beliefs = list(potentials)
+    upward = [None] * len(cliques)
+    for i in range(len(cliques)):
+        if parents[i] is not None:
+            upward[i] = beliefs[i].marginal(separator(i)).normalized()
+            beliefs[parents[i]] = beliefs[parents[i]] * upward[i]
+
+    # Distribute: a parent's final belief, less what the child sent it
+    for i in reversed(range(len(cliques))):
+        if parents[i] is not None:
+            downward = (beliefs[parents[i]].marginal(separator(i)) / upward[i]).normalized()
+            beliefs[i] = beliefs[i] * downward
+
+    return beliefs
@@ -0,0 +1,140 @@
+import numpy as np
+
+from pedigree import inheritance, parents_first, pass_probabilities
+
+# Joint assignments scored at a time by `vectorised_probabilities`
+BATCH_SIZE = 1 << 16
+
+
+class FactorTables():
+    """
+    The probabilities in a `PROBS` dictionary as NumPy arrays, indexed
+    by gene count (0, 1 or 2) and trait (0 or 1).
+
+    `prior[g]` is the probability that a person with no parents listed
+    has `g` copies of the gene, `inherit[m, f, c]` the probability that
+    a child has `c` copies given that its mother has `m` and its father
+    `f`, and `emission[g, t]` the probability of trait `t` given `g`.
+    """
+
+    def __init__(self, probs):
+        genes = range(3)
+        self.prior = np.array([probs["gene"][g] for g in genes])
+        self.emission = np.array([
+            [probs["trait"][g][False], probs["trait"][g][True]] for g in genes
+        ])
+
+        passes = pass_probabilities(probs["mutation"])
+        passes = np.array([passes[g] for g in genes])
+        inherit = inheritance(passes[:, np.newaxis], passes[np.newaxis, :])
+        self.inherit = np.stack([inherit[g] for g in genes], axis=-1)
+
+
+class Family():
+    """
+    The people of a family loaded by `load_data`, as integer arrays.
+
+    People are numbered in the order of `names`; `mother[i]` and
+    `father[i]` are the numbers of person i's parents, or -1 if they are
+    not listed, and `trait[i]` is 1 or 0 if their trait is known and -1
+    otherwise. `order` lists everyone after their parents.
+    """
+
+    def __init__(self, people):
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+        self.mother = np.array(
+            [index.get(people[name]["mother"], -1) for name in self.names], dtype=np.int64
+        )
+        self.father = np.array(
+            [index.get(people[name]["father"], -1) for name in self.names], dtype=np.int64
+        )
+        self.trait = np.array([
+            -1 if people[name]["trait"] is None else int(people[name]["trait"])
+            for name in self.names
+        ], dtype=np.int64)
+        self.founders = np.flatnonzero(self.mother < 0)
+        self.children = np.flatnonzero(self.mother >= 0)
+        self.order = np.array([index[name] for name in parents_first(people)], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def joint_probabilities(family, tables, genes, traits):
+    """
+    Return the joint probability of each row of a batch of assignments.
+
+    `genes` and `traits` are arrays of shape (batch, people) holding
+    each person's gene count and trait (0 or 1), so a whole batch is
+    scored by gathering from the tables and taking one product per row.
+    """
+    founders, children = family.founders, family.children
+    factors = np.concatenate([
+        tables.prior[genes[:, founders]],
+        tables.inherit[
+            genes[:, family.mother[children]],
+            genes[:, family.father[children]],
+            genes[:, children]
+        ],
+        tables.emission[genes, traits]
+    ], axis=1)
+    return factors.prod(axis=1)
+
+
+def assignments(family, start, stop):
+    """
+    Return the gene and trait arrays of joint assignments `start` to
+    `stop`, counting in base 3 over gene counts and then base 2 over
+    unknown traits. Known traits are fixed to their observed values.
+    """
+    size = len(family)
+    unknown = np.flatnonzero(family.trait < 0)
+    index = np.arange(start, stop, dtype=np.int64)[:, np.newaxis]
+
+    genes = index // 3 ** np.arange(size, dtype=np.int64) % 3
+    traits = np.broadcast_to(family.trait, (stop - start, size)).copy()
+    traits[:, unknown] = (
+        index // 3 ** size // 2 ** np.arange(len(unknown), dtype=np.int64) % 2
+    )
+    return genes, traits
+
+
+def vectorised_probabilities(people, probs, batch_size=BATCH_SIZE):
+    """
+    Return gene and trait distributions for each person in `people`,
+    like the powerset enumeration in `heredity.main`, scoring
+    `batch_size` joint assignments at a time with NumPy.
+    """
+    family = Family(people)
+    tables = FactorTables(probs)
+    size = len(family)
+    total = 3 ** size * 2 ** int((family.trait < 0).sum())
+
+    gene_sums = np.zeros((size, 3))
+    trait_sums = np.zeros((size, 2))
+    for start in range(0, total, batch_size):
+        genes, traits = assignments(family, start, min(start + batch_size, total))
+        p = joint_probabilities(family, tables, genes, traits)
+        for i in range(size):
+            gene_sums[i] += np.bincount(genes[:, i], weights=p, minlength=3)
+            trait_sums[i] += np.bincount(traits[:, i], weights=p, minlength=2)
+
+    gene_sums /= gene_sums.sum(axis=1, keepdims=True)
+    trait_sums /= trait_sums.sum(axis=1, keepdims=True)
+    return as_probabilities(family, gene_sums, trait_sums)
+
+
+def as_probabilities(family, genes, traits):
+    """
+    Return arrays of gene distributions, shape (people, 3), and trait
+    distributions, shape (people, 2), in the dictionary structure used
+    by `heredity.normalize`.
+    """
+    return {
+        name: {
+            "gene": {g: float(genes[i, g]) for g in (2, 1, 0)},
+            "trait": {t: float(traits[i, int(t)]) for t in (True, False)}
+        }
+        for i, name in enumerate(family.names)
+    }
@@ -1,6 +1,18 @@
+import argparse
 import csv
+import glob
 import itertools
+import json
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from elimination import elimination_probabilities
+from factors import vectorised_probabilities
+from pedigree import inheritance, parents_first, pass_probabilities
+from sampling import NotConverged, gibbs_sampling, likelihood_weighting
 
 PROBS = {
 
@@ -38,10 +50,157 @@ PROBS = {
 
 
 def main():
-    # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Compute gene and trait probabilities for a family."
+    )
+    parser.add_argument("data", help="CSV file of name, mother, father, trait, "
+                                     "or with --batch a directory or glob of them")
+    parser.add_argument("--method",
+                        choices=("enumerate", "pruned", "vectorised", "elimination",
+                                 "likelihood", "gibbs"),
+                        default="elimination",
+                        help="sum over every joint assignment, over gene "
+                             "assignments only, in NumPy batches, run exact "
+                             "inference on a junction tree, or estimate by "
+                             "likelihood weighting or Gibbs sampling "
+                             "(default: elimination)")
+    parser.add_argument("--target-error", type=float, default=1e-3,
+                        help="standard error at which sampling stops (default: 0.001)")
+    parser.add_argument("--seed", type=int,
+                        help="random seed for sampling methods")
+    parser.add_argument("--batch", action="store_true",
+                        help="score every family matched by DATA, writing "
+                             "results to standard output")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl",
+                        help="output format for --batch (default: jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes used by --batch (default: CPU count)")
+    args = parser.parse_args()
+
+    if args.batch:
+        filenames = find_families(args.data)
+        start = time.perf_counter()
+        scored = run_batch(filenames, args.method, sys.stdout, args.format, args.workers,
+                           args.seed, args.target_error)
+        elapsed = time.perf_counter() - start
+        print(f"Scored {scored} of {len(filenames)} families in {elapsed:.2f}s "
+              f"({scored / elapsed if elapsed else 0:.1f} families/s)", file=sys.stderr)
+        return
+
+    people = load_data(args.data)
+    try:
+        probabilities = family_probabilities(people, args.method, args.seed, args.target_error)
+    except NotConverged as error:
+        sys.exit(f"{args.data}: {error}")
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def family_probabilities(people, method, seed=None, target_error=1e-3):
+    """
+    Return gene and trait distributions for each person in `people`,
+    computed with `method` (one of the --method choices). Sampling
+    methods use `seed` and stop at standard error `target_error`,
+    raising NotConverged if they cannot reach it.
+    """
+    if method == "enumerate":
+        return enumerate_probabilities(people)
+    elif method == "pruned":
+        return pruned_probabilities(people)
+    elif method == "vectorised":
+        return vectorised_probabilities(people, PROBS)
+    elif method == "likelihood":
+        return likelihood_weighting(people, PROBS, target_error, seed=seed)
+    elif method == "gibbs":
+        return gibbs_sampling(people, PROBS, target_error, seed=seed)
+    else:
+        return elimination_probabilities(people, PROBS)
+
+
+def find_families(pattern):
+    """
+    Return the sorted CSV files in directory `pattern`, or the files
+    matching it as a glob if it is not a directory.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    return sorted(glob.glob(pattern))
+
+
+def run_batch(filenames, method, output, output_format, workers, seed=None,
+              target_error=1e-3):
+    """
+    Score each family in `filenames` with `method`, writing results to
+    `output` in input order as they arrive, and return the number of
+    families scored.
+
+    Each family is one JSON line mapping "family" to its filename and
+    "people" to its probabilities, or with `output_format` "csv", one
+    row per person of their gene and trait distributions. Families are
+    spread over `workers` processes; ones that cannot be read, or whose
+    sampling does not converge, are reported on standard error and
+    skipped. `seed` and `target_error` are passed to sampling methods.
+    """
+    if output_format == "csv":
+        writer = csv.writer(output)
+        writer.writerow(["family", "name", "gene_2", "gene_1", "gene_0",
+                         "trait_true", "trait_false"])
+
+    score = partial(score_family, method=method, seed=seed, target_error=target_error)
+    if workers <= 1:
+        results = map(score, filenames)
+    else:
+        pool = ProcessPoolExecutor(workers)
+        results = pool.map(score, filenames, chunksize=16)
+
+    scored = 0
+    try:
+        for filename, probabilities, error in results:
+            if error is not None:
+                print(f"{filename}: {error}", file=sys.stderr)
+                continue
+            scored += 1
+            if output_format == "csv":
+                for person, distributions in probabilities.items():
+                    writer.writerow(
+                        [filename, person] +
+                        [distributions["gene"][g] for g in (2, 1, 0)] +
+                        [distributions["trait"][t] for t in (True, False)]
+                    )
+            else:
+                output.write(json.dumps({"family": filename, "people": probabilities}) + "\n")
+    finally:
+        if workers > 1:
+            pool.shutdown()
+    return scored
+
+
+def score_family(filename, method, seed=None, target_error=1e-3):
+    """
+    Return `filename`, the probabilities of the family in it, and None,
+    or `filename`, None and an error message if it cannot be read or
+    its sampling does not converge.
+    """
+    try:
+        people = load_data(filename)
+        return filename, family_probabilities(people, method, seed, target_error), None
+    except (OSError, KeyError, ValueError, UnicodeDecodeError, NotConverged) as error:
+        return filename, None, f"{type(error).__name__}: {error}"
+
+
+def enumerate_probabilities(people):
+    """
+    Return gene and trait distributions for each person in `people` by
+    summing the joint probability of every assignment of genes and
+    traits consistent with the known traits.
+    """
 
     # Keep track of gene and trait probabilities for each person
     probabilities = {
@@ -80,15 +239,96 @@ def main():
                 update(probabilities, one_gene, two_genes, have_trait, p)
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+
+def pruned_probabilities(people):
+    """
+    Return gene and trait distributions for each person in `people` by
+    summing over gene assignments only.
+
+    Known traits are fixed, and each unknown trait is summed out
+    analytically: an assignment with probability `p` in which a person
+    has `genes` copies adds `p * P(trait | genes)` to their trait
+    distribution. Assignments come from `gene_assignments`, so no
+    powerset is ever built.
+    """
+    probabilities = {
+        person: {
+            "gene": {
+                2: 0,
+                1: 0,
+                0: 0
+            },
+            "trait": {
+                True: 0,
+                False: 0
+            }
+        }
+        for person in people
+    }
+
+    for genes, p in gene_assignments(people):
+        for person, count in genes.items():
+            probabilities[person]["gene"][count] += p
+            trait = people[person]["trait"]
+            if trait is None:
+                for value in (True, False):
+                    probabilities[person]["trait"][value] += p * PROBS["trait"][count][value]
+            else:
+                probabilities[person]["trait"][trait] += p
+
+    normalize(probabilities)
+    return probabilities
+
+
+def gene_assignments(people):
+    """
+    Yield every assignment of gene counts to `people` with nonzero
+    probability of matching the known traits, as a dictionary mapping
+    each person to their count, along with that probability.
+
+    People are assigned parents first, keeping the probability of each
+    prefix of the assignment, so moving to the next assignment only
+    recomputes the factors of the people whose counts changed, and a
+    prefix with zero probability is never extended.
+    """
+    order = parents_first(people)
+    size = len(order)
+    position = {person: i for i, person in enumerate(order)}
+    mothers = [position.get(people[person]["mother"]) for person in order]
+    fathers = [position.get(people[person]["father"]) for person in order]
+
+    passes = pass_probabilities(PROBS["mutation"])
+
+    # counts[i] is the count of person i, prefix[i] the probability of counts[:i]
+    counts = [-1] * size
+    prefix = [1] * (size + 1)
+    i = 0
+    while i >= 0:
+        if i == size:
+            yield dict(zip(order, counts)), prefix[size]
+            i -= 1
+            continue
+
+        counts[i] += 1
+        if counts[i] > 2:
+            counts[i] = -1
+            i -= 1
+            continue
+
+        genes = counts[i]
+        if mothers[i] is None:
+            p = PROBS["gene"][genes]
+        else:
+            p = inheritance(passes[counts[mothers[i]]], passes[counts[fathers[i]]])[genes]
+        trait = people[order[i]]["trait"]
+        if trait is not None:
+            p *= PROBS["trait"][genes][trait]
+
+        prefix[i + 1] = prefix[i] * p
+        if prefix[i + 1] > 0:
+            i += 1
 
 
 def load_data(filename):
@@ -0,0 +1,46 @@
+def parents_first(people):
+    """
+    Return the names in `people` ordered so that everyone comes after
+    their parents.
+    """
+    order = []
+    placed = set()
+    for person in people:
+        stack = [person]
+        while stack:
+            current = stack[-1]
+            if current in placed:
+                stack.pop()
+                continue
+            parents = [
+                parent for parent in (people[current]["mother"], people[current]["father"])
+                if parent and parent not in placed
+            ]
+            if parents:
+                stack.extend(parents)
+            else:
+                stack.pop()
+                placed.add(current)
+                order.append(current)
+    return order
+
+
+def pass_probabilities(mutation):
+    """
+    Return a dictionary mapping a parent's gene count to the probability
+    that they pass the gene on, given the `mutation` probability.
+    """
+    return {2: 1 - mutation, 1: 0.5, 0: mutation}
+
+
+def inheritance(mother, father):
+    """
+    Return a dictionary mapping a child's gene count to its probability,
+    given the probabilities `mother` and `father` that each parent
+    passes the gene on. Works elementwise on NumPy arrays too.
+    """
+    return {
+        2: mother * father,
+        1: mother * (1 - father) + (1 - mother) * father,
+        0: (1 - mother) * (1 - father)
+    }
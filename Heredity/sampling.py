@@ -0,0 +1,261 @@
+import numpy as np
+
+from factors import Family, FactorTables, as_probabilities
+
+# Fewest effective samples likelihood weighting trusts its error estimate with
+MIN_EFFECTIVE = 100
+
+# Gibbs sweeps between checks of the stopping rule
+CHECK_EVERY = 10
+
+# Fraction of the sample or sweep budget spent before a sampler projects its cost
+PROJECT_AFTER = 0.01
+
+
+class NotConverged(RuntimeError):
+    """
+    Raised when a sampling method cannot reach its target error within
+    its sample budget, so its estimates would not be trustworthy.
+    """
+
+
+def likelihood_weighting(people, probs, target_error=1e-3, chains=1000,
+                         max_samples=10 ** 7, seed=None):
+    """
+    Return approximate gene and trait distributions for each person in
+    `people`, in the structure `heredity.normalize` produces, by
+    likelihood weighting.
+
+    Each round draws `chains` gene assignments at once, parents first,
+    and weights each by the probability of the known traits given it.
+    Unknown traits are summed out using P(trait | genes). Rounds stop
+    once the estimated standard error of every probability is below
+    `target_error`.
+
+    Samples ignore the evidence, so when many known traits are unlikely
+    a few samples carry nearly all the weight. Raises NotConverged if
+    the target is not met within `max_samples` samples, or as soon as
+    the effective sample size seen so far projects that it will not be;
+    `gibbs_sampling` copes better with such families.
+    """
+    family = Family(people)
+    tables = FactorTables(probs)
+    rng = np.random.default_rng(seed)
+    size = len(family)
+    observed = np.flatnonzero(family.trait >= 0)
+
+    # Weighted sums of each feature, and of squares, relative to exp(shift)
+    shift = -np.inf
+    weight = weight_squared = 0.0
+    totals = np.zeros(size * 4)
+    totals_squared = np.zeros(size * 4)
+    cross = np.zeros(size * 4)
+
+    samples = 0
+    while samples < max_samples:
+        genes = forward_sample(family, tables, rng, chains)
+        with np.errstate(divide="ignore"):
+            log_weights = np.log(
+                tables.emission[genes[:, observed], family.trait[observed]]
+            ).sum(axis=1)
+        samples += chains
+
+        # Rescale the sums whenever a heavier sample arrives, so nothing underflows
+        if log_weights.max() > shift:
+            scale = np.exp(shift - log_weights.max())
+            shift = log_weights.max()
+            weight *= scale
+            totals *= scale
+            weight_squared *= scale ** 2
+            totals_squared *= scale ** 2
+            cross *= scale ** 2
+        weights = np.exp(log_weights - shift)
+
+        values = features(family, tables, genes)
+        weight += weights.sum()
+        weight_squared += (weights ** 2).sum()
+        totals += weights @ values
+        cross += weights ** 2 @ values
+        totals_squared += weights ** 2 @ values ** 2
+
+        # Standard error of each self-normalised estimate
+        effective = weight ** 2 / weight_squared if weight else 0.0
+        if effective < MIN_EFFECTIVE:
+            needed = samples * MIN_EFFECTIVE / effective if effective else np.inf
+        else:
+            mean = totals / weight
+            variance = (totals_squared - 2 * mean * cross + mean ** 2 * weight_squared) / weight ** 2
+            error = np.sqrt(np.maximum(variance, 0)).max()
+            if error <= target_error:
+                return estimate(family, mean)
+            needed = samples * (error / target_error) ** 2
+
+        # The error shrinks as one over the square root of the samples
+        if samples >= PROJECT_AFTER * max_samples and needed > max_samples:
+            raise NotConverged(
+                f"likelihood weighting would need about {needed:.3g} samples "
+                f"to reach standard error {target_error} (effective sample "
+                f"size {effective:.0f} of {samples}); try Gibbs sampling"
+            )
+
+    raise NotConverged(
+        f"likelihood weighting did not reach standard error {target_error} "
+        f"in {samples} samples; try Gibbs sampling"
+    )
+
+
+def gibbs_sampling(people, probs, target_error=1e-3, chains=100, burn_in=100,
+                   max_sweeps=10 ** 5, seed=None):
+    """
+    Return approximate gene and trait distributions for each person in
+    `people`, in the structure `heredity.normalize` produces, by Gibbs
+    sampling of the gene counts.
+
+    `chains` independent chains start from assignments drawn parents
+    first and are advanced together, resampling one person at a time
+    from their distribution given everyone else's genes and their own
+    known trait. After `burn_in` sweeps, each chain averages those
+    conditional distributions rather than the sampled counts. Sweeps
+    stop once the standard error across chains of every probability is
+    below `target_error`; raises NotConverged if that takes more than
+    `max_sweeps`, or as soon as the error so far projects that it will.
+    """
+    family = Family(people)
+    tables = FactorTables(probs)
+    rng = np.random.default_rng(seed)
+    size = len(family)
+    chains = max(2, chains)
+
+    with np.errstate(divide="ignore"):
+        log_prior = np.log(tables.prior)
+        log_inherit = np.log(tables.inherit)
+        log_emission = np.log(tables.emission)
+
+    # Each person's children, with whether they are the mother
+    children = [[] for _ in range(size)]
+    for child in family.children:
+        children[family.mother[child]].append((child, True))
+        children[family.father[child]].append((child, False))
+
+    genes = forward_sample(family, tables, rng, chains)
+    conditionals = np.zeros((chains, size, 3))
+    totals = np.zeros((chains, size * 4))
+    kept = 0
+
+    for sweep in range(burn_in + max_sweeps):
+        for person in family.order:
+            if family.mother[person] < 0:
+                logits = np.broadcast_to(log_prior, (chains, 3)).copy()
+            else:
+                logits = log_inherit[
+                    genes[:, family.mother[person]], genes[:, family.father[person]]
+                ]
+            if family.trait[person] >= 0:
+                logits = logits + log_emission[:, family.trait[person]]
+            for child, is_mother in children[person]:
+                if is_mother:
+                    logits = logits + log_inherit[:, genes[:, family.father[child]], genes[:, child]].T
+                else:
+                    logits = logits + log_inherit[genes[:, family.mother[child]], :, genes[:, child]]
+
+            p = np.exp(logits - logits.max(axis=1, keepdims=True))
+            p /= p.sum(axis=1, keepdims=True)
+            conditionals[:, person] = p
+            genes[:, person] = choose(rng, p)
+
+        if sweep < burn_in:
+            continue
+        totals += rao_blackwell_features(family, tables, conditionals)
+        kept += 1
+
+        # Each chain's average is one estimate; their spread gives the error
+        if kept % CHECK_EVERY == 0:
+            means = totals / kept
+            error = means.std(axis=0, ddof=1).max() / np.sqrt(chains)
+            if error <= target_error:
+                return estimate(family, totals.sum(axis=0) / (kept * chains))
+            needed = kept * (error / target_error) ** 2
+            if kept >= PROJECT_AFTER * max_sweeps and needed > max_sweeps:
+                raise NotConverged(
+                    f"Gibbs sampling would need about {needed:.3g} sweeps to "
+                    f"reach standard error {target_error}"
+                )
+
+    raise NotConverged(
+        f"Gibbs sampling did not reach standard error {target_error} "
+        f"in {max_sweeps} sweeps"
+    )
+
+
+def forward_sample(family, tables, rng, count):
+    """
+    Return `count` gene assignments drawn from the prior, parents first,
+    as an array of shape (count, people).
+    """
+    genes = np.zeros((count, len(family)), dtype=np.int64)
+    for person in family.order:
+        if family.mother[person] < 0:
+            p = np.broadcast_to(tables.prior, (count, 3))
+        else:
+            p = tables.inherit[genes[:, family.mother[person]], genes[:, family.father[person]]]
+        genes[:, person] = choose(rng, p)
+    return genes
+
+
+def choose(rng, p):
+    """
+    Return one index drawn from each row of distributions `p`.
+    """
+    cumulative = p.cumsum(axis=1)
+    u = rng.random(len(p))[:, np.newaxis] * cumulative[:, -1:]
+    return np.minimum((u >= cumulative).sum(axis=1), p.shape[1] - 1)
+
+
+def features(family, tables, genes):
+    """
+    Return, for each gene assignment, each person's gene count as three
+    indicators followed by each person's probability of having the
+    trait (or their known trait), so that averaging gives the estimates.
+    """
+    count, size = genes.shape
+    values = np.zeros((count, size * 4))
+    values[np.arange(count)[:, np.newaxis], np.arange(size) * 3 + genes] = 1
+    values[:, size * 3:] = trait_probability(family, tables, genes)
+    return values
+
+
+def rao_blackwell_features(family, tables, conditionals):
+    """
+    Return `features` averaged over each person's conditional gene
+    distribution rather than taken at a sampled count.
+    """
+    chains, size, _ = conditionals.shape
+    values = np.zeros((chains, size * 4))
+    values[:, :size * 3] = conditionals.reshape(chains, size * 3)
+    with_trait = conditionals @ tables.emission[:, 1]
+    known = family.trait >= 0
+    with_trait[:, known] = family.trait[known]
+    values[:, size * 3:] = with_trait
+    return values
+
+
+def trait_probability(family, tables, genes):
+    """
+    Return the probability that each person has the trait given `genes`,
+    or 1 or 0 for people whose trait is known.
+    """
+    p = tables.emission[genes, 1]
+    known = family.trait >= 0
+    p[:, known] = family.trait[known]
+    return p
+
+
+def estimate(family, means):
+    """
+    Return averaged `features` in the structure of `heredity.normalize`.
+    """
+    size = len(family)
+    genes = means[:size * 3].reshape(size, 3)
+    genes = genes / genes.sum(axis=1, keepdims=True)
+    trait = means[size * 3:]
+    return as_probabilities(family, genes, np.stack([1 - trait, trait], axis=1))
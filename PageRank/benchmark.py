@@ -0,0 +1,182 @@
+import argparse
+import copy
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import pagerank
+from crawler import crawl_graph
+from engine import TransitionMatrix, power_iteration, sample_ranks, solve
+from linkgraph import LinkGraph
+from parallel import parallel_power_iteration
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time PageRank on a synthetic preferential-attachment corpus."
+    )
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--links", type=int, default=8,
+                        help="links added by each page that has links (default: 8)")
+    parser.add_argument("--dangling", type=float, default=0.1,
+                        help="fraction of pages with no links (default: 0.1)")
+    parser.add_argument("--samples", type=int, default=10000,
+                        help="samples drawn by the sampling methods (default: 10000)")
+    parser.add_argument("--slow-limit", type=int, default=2000,
+                        help="skip sample_pagerank and iterate_pagerank, and use "
+                             "power iteration instead of a dense solve as the "
+                             "reference, above this many pages (default: 2000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--directory",
+                        help="write the corpus here and keep it "
+                             "(default: a temporary directory)")
+    args = parser.parse_args()
+
+    if args.directory:
+        os.makedirs(args.directory, exist_ok=True)
+        run(args, args.directory)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            run(args, directory)
+
+
+def run(args, directory):
+    """
+    Generate the corpus in `directory` and print timings for it.
+    """
+    links = generate(directory, args.pages, args.links, args.dangling, args.seed)
+    print(f"Corpus: {args.pages} pages, {links} links, "
+          f"{args.dangling:.0%} dangling, damping {pagerank.DAMPING}")
+    pages = args.pages
+    slow = pages <= args.slow_limit
+
+    # Crawling
+    corpus, elapsed = timed(lambda: pagerank.crawl(directory))
+    report("crawl", elapsed, f"{pages / elapsed:,.0f} pages/s")
+    graph, elapsed = timed(lambda: crawl_graph(directory, args.workers))
+    report("crawl_graph", elapsed, f"{pages / elapsed:,.0f} pages/s")
+    graph = LinkGraph.from_corpus(corpus)
+    matrix = TransitionMatrix(graph)
+
+    # High-precision reference, in crawl's sorted page order. The dense solve
+    # shares no code with the engines; larger graphs fall back to power
+    # iteration, which then cannot catch errors in TransitionMatrix itself.
+    if slow:
+        reference = dense_pagerank(graph, pagerank.DAMPING)
+        print("Reference: dense linear solve")
+    else:
+        reference = power_iteration(matrix, pagerank.DAMPING, 1e-14, 100000)
+        print("Reference: power iteration to 1e-14 (not independent of the engines)")
+
+    def error(ranks):
+        if isinstance(ranks, dict):
+            ranks = np.array([ranks[name] for name in graph.names])
+        return np.abs(ranks - reference).sum()
+
+    # Sampling
+    if slow:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+        ranks, elapsed = timed(
+            lambda: pagerank.sample_pagerank(corpus, pagerank.DAMPING, args.samples)
+        )
+        report("sample_pagerank", elapsed,
+               f"{args.samples / elapsed:,.0f} samples/s, L1 error {error(ranks):.2e}")
+    ranks, elapsed = timed(
+        lambda: sample_ranks(graph, pagerank.DAMPING, args.samples, seed=args.seed)
+    )
+    report("sample_ranks", elapsed,
+           f"{args.samples / elapsed:,.0f} samples/s, L1 error {error(ranks):.2e}")
+
+    # Iteration
+    if slow:
+        ranks, elapsed = timed(
+            lambda: pagerank.iterate_pagerank(copy.deepcopy(corpus), pagerank.DAMPING)
+        )
+        report("iterate_pagerank", elapsed,
+               f"{pages / elapsed:,.0f} pages/s, L1 error {error(ranks):.2e}")
+    for method in ("power", "aitken", "quadratic"):
+        result, elapsed = timed(lambda: solve(matrix, pagerank.DAMPING, method))
+        report(f"solve ({method})", elapsed,
+               f"{pages * result.products / elapsed:,.0f} page-products/s, "
+               f"{result.iterations} iterations ({result.products} products), "
+               f"L1 error {error(result.ranks):.2e}")
+    ranks, elapsed = timed(
+        lambda: parallel_power_iteration(graph, pagerank.DAMPING, workers=args.workers)
+    )
+    report(f"parallel ({args.workers} workers)", elapsed,
+           f"{pages / elapsed:,.0f} pages/s, L1 error {error(ranks):.2e}")
+
+
+def dense_pagerank(graph, damping_factor):
+    """
+    Return the exact PageRank vector of `graph` by solving the linear
+    system r = d (P r + D r / N) + (1 - d) / N with a dense matrix, where
+    P spreads each page's rank evenly over its links and D over every
+    page from pages without links.
+    """
+    size = len(graph)
+    out_degree = np.asarray(graph.out_degree())
+    transition = np.zeros((size, size))
+    for page in range(size):
+        links = graph.targets[graph.offsets[page]:graph.offsets[page + 1]]
+        if len(links):
+            np.add.at(transition[:, page], links, 1 / out_degree[page])
+        else:
+            transition[:, page] = 1 / size
+    system = np.eye(size) - damping_factor * transition
+    ranks = np.linalg.solve(system, np.full(size, (1 - damping_factor) / size))
+    return ranks / ranks.sum()
+
+
+def generate(directory, pages, links, dangling, seed):
+    """
+    Write `pages` HTML files to `directory` and return the number of
+    links written.
+
+    Pages are added one at a time. Each page has no links with
+    probability `dangling`; otherwise it links to `links` earlier pages,
+    each chosen with probability proportional to one plus the number of
+    links it already receives (preferential attachment).
+    """
+    rng = random.Random(seed)
+
+    # Each page appears once, plus once for every link it receives
+    targets = []
+    total = 0
+    for page in range(pages):
+        outlinks = set()
+        if page > 0 and rng.random() >= dangling:
+            for _ in range(links):
+                outlinks.add(rng.choice(targets))
+        targets.append(page)
+        targets.extend(outlinks)
+        total += len(outlinks)
+
+        anchors = "\n".join(
+            f'<a href="p{target}.html">Page {target}</a>' for target in sorted(outlinks)
+        )
+        with open(os.path.join(directory, f"p{page}.html"), "w") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<body>\n{anchors}\n</body>\n</html>\n")
+    return total
+
+
+def timed(function):
+    """
+    Return the result of calling `function` and the wall time it took.
+    """
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def report(label, elapsed, detail):
+    print(f"  {label:<28} {elapsed:10.3f}s  {detail}")
+
+
+if __name__ == "__main__":
+    main()
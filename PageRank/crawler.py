@@ -0,0 +1,119 @@
+import html
+import os
+import posixpath
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from urllib.parse import unquote, urlsplit
+
+from linkgraph import LinkGraph
+
+# Characters read from a page at a time
+CHUNK_SIZE = 64 * 1024
+
+# Start of an <a> tag up to its href value, in any letter case, with the
+# value double-quoted, single-quoted or unquoted and possibly entity-escaped
+LINK = re.compile(
+    r"""<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+))""",
+    re.IGNORECASE
+)
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python crawler.py corpus output")
+    graph = crawl_graph(sys.argv[1])
+    graph.save(sys.argv[2])
+    print(f"Saved {len(graph)} pages and {len(graph.targets)} links to {sys.argv[2]}")
+
+
+def crawl_graph(directory, workers=None):
+    """
+    Parse every HTML page under `directory`, including subdirectories,
+    and return a LinkGraph of the links between them.
+
+    Pages are named by their path relative to `directory`, and links are
+    resolved relative to the page they appear on. Pages are parsed in
+    chunks, spread over `workers` processes (default: CPU count).
+    """
+    pages = find_pages(directory)
+    return LinkGraph.from_links(pages, parse_pages(directory, pages, workers))
+
+
+def parse_pages(directory, pages, workers=None):
+    """
+    Yield the set of links on each of `pages`, in order, parsing them
+    across `workers` processes (default: CPU count).
+    """
+    parse = partial(page_links, directory)
+    if workers == 1:
+        yield from map(parse, pages)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(parse, pages, chunksize=64)
+
+
+def find_pages(directory):
+    """
+    Return the sorted paths, relative to `directory` and separated by
+    "/", of all HTML files under it.
+    """
+    pages = []
+    for root, _, filenames in os.walk(directory):
+        relative = os.path.relpath(root, directory)
+        for filename in filenames:
+            if filename.endswith(".html"):
+                path = filename if relative == "." else os.path.join(relative, filename)
+                pages.append(path.replace(os.sep, "/"))
+    return sorted(pages)
+
+
+def page_links(directory, page):
+    """
+    Return the set of pages linked to by `page`, read from `directory`
+    in chunks, with links normalised to paths relative to `directory`.
+    Links to the page itself and to other sites are left out.
+
+    Each chunk is scanned for links as it is read; a tag cut off by the
+    end of a chunk is carried over to the next one.
+    """
+    hrefs = set()
+    tail = ""
+    with open(os.path.join(directory, page), encoding="utf-8", errors="replace") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ""):
+            text = tail + chunk
+
+            # Hold back a tag cut off by the end of the chunk
+            cut = text.rfind("<")
+            if cut != -1 and text.find(">", cut) == -1 and len(text) - cut < CHUNK_SIZE:
+                text, tail = text[:cut], text[cut:]
+            else:
+                tail = ""
+
+            for match in LINK.finditer(text):
+                hrefs.add(html.unescape(match.group(1) or match.group(2) or match.group(3)))
+    return {normalise(page, href) for href in hrefs if href} - {None, page}
+
+
+def normalise(page, href):
+    """
+    Return the path, relative to the corpus root, that `href` on `page`
+    points to, or None if it points outside the corpus.
+    """
+    parts = urlsplit(href)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if path.startswith("/"):
+        path = path.lstrip("/")
+    else:
+        path = posixpath.join(posixpath.dirname(page), path)
+    path = posixpath.normpath(path)
+    if path == ".." or path.startswith("../"):
+        return None
+    return path
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import sys
+import time
+
+import numpy as np
+
+from linkgraph import LinkGraph
+
+DAMPING = 0.85
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python engine.py graph [top]")
+    graph = LinkGraph.load(sys.argv[1])
+    top = int(sys.argv[2]) if len(sys.argv) == 3 else 20
+    ranks = power_iteration(TransitionMatrix(graph, chunk_size=1 << 24), DAMPING)
+    print(f"PageRank Results from Power Iteration (top {top} of {len(graph)})")
+    for page in np.argsort(-ranks)[:top]:
+        print(f"  {graph.names[page]}: {ranks[page]:.6f}")
+
+
+class TransitionMatrix():
+    """
+    Sparse PageRank transition matrix of a LinkGraph, built once.
+
+    Pages without links are not given links to every page; their rank
+    is collected separately each iteration and spread over the teleport
+    vector instead.
+
+    With `chunk_size`, links are read in chunks of about that many per
+    product instead of being indexed all at once, so a memory-mapped
+    graph is streamed from disk rather than loaded.
+    """
+
+    def __init__(self, graph, chunk_size=None):
+        self.graph = graph
+        out_degree = graph.out_degree()
+        self.dangling = out_degree == 0
+        self.inverse_degree = np.zeros(len(graph))
+        self.inverse_degree[~self.dangling] = 1 / out_degree[~self.dangling]
+        if chunk_size is None:
+            self.sources = np.repeat(
+                np.arange(len(graph), dtype=np.int32), out_degree
+            )
+            self.chunks = None
+        else:
+            self.sources = None
+            self.chunks = row_chunks(graph.offsets, chunk_size)
+
+    def __len__(self):
+        return len(self.graph)
+
+    def dot(self, ranks):
+        """
+        Return the rank each page receives through links when every
+        page with links splits `ranks` evenly between them.
+
+        `ranks` may also be a block with one rank vector per column, in
+        which case all columns are multiplied in a single pass.
+        """
+        if ranks.ndim == 1:
+            weights = ranks * self.inverse_degree
+        else:
+            weights = ranks * self.inverse_degree[:, None]
+        if self.chunks is None:
+            return self.product(self.sources, self.graph.targets, weights)
+
+        offsets = self.graph.offsets
+        result = np.zeros(ranks.shape)
+        for start, stop in self.chunks:
+            sources = np.repeat(
+                np.arange(start, stop, dtype=np.int32),
+                np.diff(offsets[start:stop + 1])
+            )
+            targets = np.asarray(self.graph.targets[offsets[start]:offsets[stop]])
+            result += self.product(sources, targets, weights)
+        return result
+
+    def product(self, sources, targets, weights):
+        """
+        Return the sum of `weights[source]` into each target page over
+        the links from `sources` to `targets`.
+        """
+        if weights.ndim == 1:
+            return np.bincount(targets, weights=weights[sources], minlength=len(self))
+
+        # Give every (page, column) pair its own bin
+        columns = weights.shape[1]
+        bins = targets[:, None].astype(np.int64) * columns + np.arange(columns)
+        return np.bincount(
+            bins.ravel(), weights=weights[sources].ravel(),
+            minlength=len(self) * columns
+        ).reshape(len(self), columns)
+
+
+def row_chunks(offsets, chunk_size):
+    """
+    Return (start, stop) page ranges covering all rows of CSR `offsets`
+    with about `chunk_size` links each. A page with more links than
+    that gets a range of its own.
+    """
+    links = int(offsets[-1])
+    starts = np.searchsorted(offsets, np.arange(0, links, chunk_size), side="right") - 1
+    bounds = np.unique(np.append(starts, [0, len(offsets) - 1]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def power_iteration(matrix, damping_factor, tolerance=1e-10,
+                    max_iterations=1000, initial=None, teleport=None):
+    """
+    Return the PageRank vector of `matrix` by power iteration, stopping
+    once the L1 norm of the change between iterations is below
+    `tolerance`.
+
+    If `initial` is given, iteration starts from it instead of the
+    teleport vector. `teleport` is the distribution surfers jump to
+    (and leave dangling pages by), uniform if not given; a block with
+    one distribution per column solves all of them together.
+    """
+    n = len(matrix)
+    if teleport is None:
+        teleport = np.full(n, 1 / n)
+    if initial is None:
+        ranks = teleport.copy()
+    else:
+        ranks = initial / initial.sum(axis=0)
+
+    for _ in range(max_iterations):
+        new_ranks = step(matrix, ranks, damping_factor, teleport)
+        change = np.abs(new_ranks - ranks).sum(axis=0).max()
+        ranks = new_ranks
+        if change < tolerance:
+            break
+
+    return ranks
+
+
+def step(matrix, ranks, damping_factor, teleport):
+    """
+    Return the ranks after one power iteration step from `ranks`.
+    """
+    dangling = ranks[matrix.dangling].sum(axis=0)
+    new_ranks = damping_factor * matrix.dot(ranks)
+    new_ranks += (damping_factor * dangling + 1 - damping_factor) * teleport
+    return new_ranks
+
+
+class Convergence():
+    """
+    Rank vector found by `solve` along with how it got there: the L1
+    and L-infinity norms of the change made by each iteration, the
+    wall time elapsed after each iteration, the number of dangling
+    pages, and the number of matrix products, including any spent on
+    rejected extrapolations.
+    """
+
+    def __init__(self, method, ranks, l1, linf, times, dangling, converged,
+                 products=None):
+        self.method = method
+        self.ranks = ranks
+        self.l1 = l1
+        self.linf = linf
+        self.times = times
+        self.dangling = dangling
+        self.converged = converged
+        self.products = len(l1) if products is None else products
+
+    @property
+    def iterations(self):
+        return len(self.l1)
+
+    def __repr__(self):
+        elapsed = self.times[-1] if self.times else 0
+        residual = self.l1[-1] if self.l1 else float("nan")
+        return (f"Convergence(method={self.method!r}, iterations={self.iterations}, "
+                f"products={self.products}, l1={residual:.3g}, seconds={elapsed:.3f}, "
+                f"converged={self.converged})")
+
+
+def solve(matrix, damping_factor, method="power", tolerance=1e-10,
+          max_iterations=1000, initial=None, teleport=None, period=10):
+    """
+    Return a Convergence for the PageRank vector of `matrix`, stopping
+    once the L1 norm of the change made by an iteration is below
+    `tolerance`.
+
+    `method` is "power" for plain power iteration, or "aitken" or
+    "quadratic" to try, every `period` iterations, the Aitken
+    delta-squared or quadratic extrapolation (Kamvar et al., 2003) of
+    the last three or four iterates. An extrapolation is only kept if
+    one step from it changes the ranks by less than a plain step is
+    guaranteed to, so it never slows convergence by more than the
+    rejected trial steps, which are counted in `products`. `initial`
+    and `teleport` are as for `power_iteration`, but only a single
+    teleport vector is supported.
+    """
+    if method not in EXTRAPOLATIONS:
+        raise ValueError(f"unknown method {method!r}")
+    n = len(matrix)
+    if teleport is None:
+        teleport = np.full(n, 1 / n)
+    ranks = teleport.copy() if initial is None else initial / initial.sum()
+    extrapolate = EXTRAPOLATIONS[method]
+    history = [ranks]
+
+    l1, linf, times = [], [], []
+    products = 0
+    converged = False
+    start = time.perf_counter()
+
+    def record(new_ranks, old_ranks):
+        change = np.abs(new_ranks - old_ranks)
+        l1.append(float(change.sum()))
+        linf.append(float(change.max()) if n else 0.0)
+        times.append(time.perf_counter() - start)
+
+    while len(l1) < max_iterations:
+        new_ranks = step(matrix, ranks, damping_factor, teleport)
+        products += 1
+        record(new_ranks, ranks)
+        ranks = new_ranks
+        if l1[-1] < tolerance:
+            converged = True
+            break
+
+        history = history[-3:] + [ranks]
+        if extrapolate is None or len(l1) % period != 0 or len(l1) == max_iterations:
+            continue
+        extrapolated = extrapolate(history)
+        if extrapolated is None:
+            continue
+
+        # A plain step shrinks the change by at least the damping factor;
+        # keep the extrapolation only if a step from it does better
+        trial = step(matrix, extrapolated, damping_factor, teleport)
+        products += 1
+        if np.abs(trial - extrapolated).sum() < damping_factor * l1[-1]:
+            record(trial, extrapolated)
+            ranks = trial
+            history = [extrapolated, trial]
+            if l1[-1] < tolerance:
+                converged = True
+                break
+
+    return Convergence(method, ranks, l1, linf, times,
+                       int(np.count_nonzero(matrix.dangling)), converged, products)
+
+
+def aitken(history):
+    """
+    Return the componentwise Aitken delta-squared extrapolation of the
+    last three iterates in `history`, or None if there are too few.
+
+    Components whose second difference is tiny are amplified noise as
+    often as not, which is why `solve` tests each extrapolation before
+    keeping it.
+    """
+    if len(history) < 3:
+        return None
+    x0, x1, x2 = history[-3:]
+    second = x2 - 2 * x1 + x0
+    safe = np.abs(second) > 1e-300
+    result = x2.copy()
+    result[safe] -= (x2[safe] - x1[safe]) ** 2 / second[safe]
+    return normalized(result)
+
+
+def quadratic(history):
+    """
+    Return the quadratic extrapolation of the last four iterates in
+    `history`, or None if there are too few.
+    """
+    if len(history) < 4:
+        return None
+    x0, x1, x2, x3 = history[-4:]
+    y = np.stack([x1 - x0, x2 - x0], axis=1)
+    gamma, *_ = np.linalg.lstsq(y, -(x3 - x0), rcond=None)
+    gamma1, gamma2, gamma3 = gamma[0], gamma[1], 1.0
+    beta0 = gamma1 + gamma2 + gamma3
+    beta1 = gamma2 + gamma3
+    beta2 = gamma3
+    return normalized(beta0 * x1 + beta1 * x2 + beta2 * x3)
+
+
+def normalized(ranks):
+    """
+    Return `ranks` made non-negative and scaled to sum to 1.
+    """
+    ranks = np.abs(ranks)
+    return ranks / ranks.sum()
+
+
+EXTRAPOLATIONS = {
+    "power": None,
+    "aitken": aitken,
+    "quadratic": quadratic,
+}
+
+
+def personalized_ranks(matrix, seed_sets, damping_factor, tolerance=1e-10,
+                       max_iterations=1000):
+    """
+    Return personalized PageRank for each collection of page indices in
+    `seed_sets`, as an array with one column per seed set.
+
+    Surfers teleport, and leave dangling pages, only to the pages of
+    their seed set, chosen uniformly. All seed sets are solved together
+    as one dense block, so each iteration is a single sparse product.
+    Raises ValueError if a seed set is empty or holds an index that is
+    not a page.
+    """
+    teleport = np.zeros((len(matrix), len(seed_sets)))
+    for column, seeds in enumerate(seed_sets):
+        seeds = np.unique(np.asarray(list(seeds), dtype=np.int64))
+        if len(seeds) == 0:
+            raise ValueError(f"seed set {column} is empty")
+        if seeds[0] < 0 or seeds[-1] >= len(matrix):
+            raise ValueError(f"seed set {column} has pages outside 0..{len(matrix) - 1}")
+        teleport[seeds, column] = 1 / len(seeds)
+    return power_iteration(matrix, damping_factor, tolerance, max_iterations,
+                           teleport=teleport)
+
+
+def sample_ranks(graph, damping_factor, n, walkers=10000, seed=None, burn_in=50):
+    """
+    Return PageRank values for each page of `graph` by sampling `n`
+    pages with many independent random surfers moving in lockstep,
+    each starting on a page chosen at random.
+
+    Surfers first take `burn_in` uncounted steps, so that the samples
+    come from the stationary distribution rather than the uniform start
+    even when `n` is not much larger than `walkers`.
+
+    Links are chosen uniformly, so a surfer's next page is found by
+    indexing its page's CSR row with one random number; no per-page
+    probability tables are needed. `seed` makes the result reproducible.
+    """
+    rng = np.random.default_rng(seed)
+    size = len(graph)
+    out_degree = graph.out_degree()
+    dangling = out_degree == 0
+    walkers = max(1, min(walkers, n))
+
+    counts = np.zeros(size, dtype=np.int64)
+    pages = rng.integers(0, size, walkers)
+    remaining = n
+    steps = 0
+    while True:
+        if steps >= burn_in:
+            counts += np.bincount(pages[:remaining], minlength=size)
+            remaining -= walkers
+            if remaining <= 0:
+                break
+
+        # Follow a link with probability `damping_factor`, else jump anywhere
+        follow = (rng.random(walkers) < damping_factor) & ~dangling[pages]
+        next_pages = rng.integers(0, size, walkers)
+        current = pages[follow]
+        choice = (rng.random(len(current)) * out_degree[current]).astype(np.int64)
+        next_pages[follow] = graph.targets[graph.offsets[current] + choice]
+        pages = next_pages
+        steps += 1
+
+    return counts / n
+
+
+if __name__ == "__main__":
+    main()
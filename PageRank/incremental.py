@@ -0,0 +1,165 @@
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+from crawler import find_pages, parse_pages
+from engine import TransitionMatrix, power_iteration
+from linkgraph import LinkGraph
+
+DAMPING = 0.85
+
+# Bump whenever the arrays saved below change
+VERSION = 1
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python incremental.py corpus")
+    graph, ranks, stats = update_pagerank(sys.argv[1], DAMPING)
+    print(f"Pages: {stats['unchanged']} unchanged, {stats['touched']} touched, "
+          f"{stats['parsed']} parsed, {stats['removed']} removed")
+    print("PageRank Results from Incremental Iteration")
+    for page, rank in sorted(graph.rank_dict(ranks).items()):
+        print(f"  {page}: {rank:.4f}")
+
+
+def state_path(directory):
+    """
+    Return the path of the saved state kept next to `directory`.
+    """
+    directory = os.path.normpath(directory)
+    return f"{directory}.pagerank-state.npz"
+
+
+def update_pagerank(directory, damping_factor, tolerance=1e-10, workers=None):
+    """
+    Re-rank the corpus in `directory`, reusing the state saved by the
+    previous call.
+
+    Pages whose size and modification time are unchanged keep their
+    saved links. Pages that changed on disk are hashed, and only those
+    whose contents differ are parsed again. Power iteration then starts
+    from the previous ranks, so a corpus that barely changed converges
+    in a few iterations.
+
+    Return the LinkGraph, its rank vector, and a dictionary counting
+    unchanged, touched (new mtime, same contents), parsed and removed
+    pages. The new state is saved for the next call.
+    """
+    previous = load_state(directory)
+    pages = find_pages(directory)
+    known = {page: i for i, page in enumerate(previous["pages"])} if previous else {}
+
+    sizes = np.zeros(len(pages), dtype=np.int64)
+    mtimes = np.zeros(len(pages), dtype=np.int64)
+    hashes = np.zeros(len(pages), dtype="S20")
+    links = [None] * len(pages)
+    stale = []
+    stats = {"unchanged": 0, "touched": 0, "parsed": 0, "removed": 0}
+
+    for i, page in enumerate(pages):
+        stat = os.stat(os.path.join(directory, page))
+        sizes[i], mtimes[i] = stat.st_size, stat.st_mtime_ns
+        j = known.get(page)
+        if j is not None and sizes[i] == previous["sizes"][j] and mtimes[i] == previous["mtimes"][j]:
+            hashes[i] = previous["hashes"][j]
+            links[i] = saved_links(previous, j)
+            stats["unchanged"] += 1
+            continue
+        hashes[i] = file_hash(os.path.join(directory, page))
+        if j is not None and hashes[i] == previous["hashes"][j]:
+            links[i] = saved_links(previous, j)
+            stats["touched"] += 1
+        else:
+            stale.append(i)
+    stats["removed"] = len(set(known) - set(pages))
+
+    for i, page_links in zip(stale, parse_pages(directory, [pages[i] for i in stale], workers)):
+        links[i] = page_links
+    stats["parsed"] = len(stale)
+
+    graph = LinkGraph.from_links(pages, links)
+
+    # Start from the previous ranks, giving new pages an even share
+    initial = None
+    if previous is not None and len(pages) > 0:
+        initial = np.full(len(pages), 1 / len(pages))
+        for i, page in enumerate(pages):
+            j = known.get(page)
+            if j is not None:
+                initial[i] = previous["ranks"][j]
+
+    ranks = power_iteration(TransitionMatrix(graph), damping_factor, tolerance,
+                            initial=initial)
+    save_state(directory, pages, sizes, mtimes, hashes, links, ranks)
+    return graph, ranks, stats
+
+
+def file_hash(path):
+    """
+    Return the SHA-1 digest of the file at `path`, read in chunks.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def saved_links(state, page):
+    """
+    Return the set of links saved for page index `page` of `state`.
+    """
+    start, stop = state["link_offsets"][page], state["link_offsets"][page + 1]
+    return {str(state["link_names"][k]) for k in state["link_targets"][start:stop]}
+
+
+def save_state(directory, pages, sizes, mtimes, hashes, links, ranks):
+    """
+    Save file metadata, every link found on each page (including links
+    to pages not in the corpus yet) and the rank vector next to
+    `directory`, replacing any previous state atomically.
+    """
+    names = sorted(set().union(*links)) if links else []
+    index = {name: i for i, name in enumerate(names)}
+    offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    targets = []
+    for i, page_links in enumerate(links):
+        targets.extend(sorted(index[link] for link in page_links))
+        offsets[i + 1] = len(targets)
+
+    path = state_path(directory)
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(
+            f,
+            version=np.array(VERSION),
+            pages=np.array(pages, dtype=str),
+            sizes=sizes, mtimes=mtimes, hashes=hashes,
+            link_names=np.array(names, dtype=str),
+            link_offsets=offsets,
+            link_targets=np.array(targets, dtype=np.int32),
+            ranks=ranks
+        )
+    os.replace(f"{path}.tmp", path)
+
+
+def load_state(directory):
+    """
+    Return the state saved for `directory` as a dictionary of arrays,
+    or None if there is none or it was saved by a different version.
+    """
+    try:
+        with np.load(state_path(directory), allow_pickle=False) as data:
+            state = {key: data[key] for key in data.files}
+    except (OSError, ValueError, KeyError):
+        return None
+    if state.get("version") != VERSION:
+        return None
+    state["pages"] = [str(page) for page in state["pages"]]
+    return state
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from array import array
+
+import numpy as np
+
+MAGIC = b"LINKGRPH"
+
+# Bump whenever the file layout below changes
+VERSION = 1
+
+# Array elements written to a saved graph at a time
+SAVE_CHUNK = 1 << 20
+
+# Magic, version, number of pages, number of links, size of the names table
+HEADER = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("pad", "<u4"),
+    ("pages", "<i8"), ("links", "<i8"), ("names", "<i8")
+])
+
+
+class LinkGraph():
+    """
+    Link structure of a corpus with pages mapped to dense integers.
+
+    Links are stored as CSR arrays: the pages linked to by page `i` are
+    `targets[offsets[i]:offsets[i + 1]]`, and `names[i]` is its name.
+    """
+
+    def __init__(self, names, offsets, targets):
+        self.names = list(names)
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Build a LinkGraph from the dictionary returned by `crawl`.
+        """
+        names = sorted(corpus)
+        return cls.from_links(names, (corpus[name] for name in names))
+
+    @classmethod
+    def from_links(cls, names, links):
+        """
+        Build a LinkGraph of the pages `names` from `links`, an iterable
+        giving the set of page names each one links to, in the same
+        order. Links to pages not in `names` are left out.
+        """
+        index = {name: i for i, name in enumerate(names)}
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        targets = array("i")
+        for i, page_links in enumerate(links):
+            targets.extend(sorted(index[link] for link in page_links if link in index))
+            offsets[i + 1] = len(targets)
+        return cls(names, offsets, np.frombuffer(targets, dtype=np.int32))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a LinkGraph saved by `save`. With `mmap`, the offsets and
+        targets are memory-mapped rather than read into memory, so graphs
+        larger than RAM can be ranked.
+        """
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a saved LinkGraph")
+        if header["version"][0] != VERSION:
+            raise ValueError(f"{path} was saved by an unsupported version")
+        pages, links = int(header["pages"][0]), int(header["links"][0])
+
+        position = HEADER.itemsize
+        arrays = []
+        for dtype, count in ((np.int64, pages + 1), (np.int32, links)):
+            if mmap:
+                arrays.append(np.memmap(path, dtype=dtype, mode="r",
+                                        offset=position, shape=(count,)))
+            else:
+                arrays.append(np.fromfile(path, dtype=dtype, count=count,
+                                          offset=position))
+            position += padded(count * np.dtype(dtype).itemsize)
+
+        with open(path, "rb") as f:
+            f.seek(position)
+            names = f.read(int(header["names"][0])).decode("utf-8")
+        names = names.split("\n") if pages else []
+        if len(names) != pages:
+            raise ValueError(f"{path} has {len(names)} page names for {pages} pages")
+        return cls(names, *arrays)
+
+    def save(self, path):
+        """
+        Save the graph in a compact binary format: a header, the CSR
+        offsets (int64) and targets (int32), each padded to 8 bytes, and
+        the page names as newline-separated UTF-8.
+
+        Arrays are written a chunk at a time, so saving a memory-mapped
+        graph does not read it all into memory. Raises ValueError if a
+        page name contains a newline.
+        """
+        names = "\n".join(self.names).encode("utf-8")
+        if self.names and names.count(b"\n") != len(self.names) - 1:
+            raise ValueError("page names cannot contain newlines")
+        header = np.zeros(1, dtype=HEADER)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["pages"] = len(self.names)
+        header["links"] = len(self.targets)
+        header["names"] = len(names)
+        with open(path, "wb") as f:
+            f.write(header.tobytes())
+            for values, dtype in ((self.offsets, np.int64), (self.targets, np.int32)):
+                for start in range(0, len(values), SAVE_CHUNK):
+                    np.asarray(values[start:start + SAVE_CHUNK], dtype=dtype).tofile(f)
+                size = len(values) * np.dtype(dtype).itemsize
+                f.write(bytes(padded(size) - size))
+            f.write(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def out_degree(self):
+        """
+        Return the number of links on each page.
+        """
+        return np.diff(self.offsets)
+
+    def rank_dict(self, ranks):
+        """
+        Return a dictionary mapping page names to values of `ranks`.
+        """
+        return {name: float(rank) for name, rank in zip(self.names, ranks)}
+
+
+def padded(size):
+    """
+    Return `size` rounded up to a multiple of 8.
+    """
+    return (size + 7) // 8 * 8
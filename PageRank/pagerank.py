@@ -4,6 +4,9 @@ import re
 import sys
 import numpy as np
 
+from engine import TransitionMatrix, personalized_ranks, power_iteration, sample_ranks
+from linkgraph import LinkGraph
+
 DAMPING = 0.85
 SAMPLES = 10000
 
@@ -51,6 +54,14 @@ def crawl(directory):
     return pages
 
 
+def save_corpus(corpus, path):
+    """
+    Save the dictionary returned by `crawl` to `path` in the compact
+    binary format read by `LinkGraph.load`.
+    """
+    LinkGraph.from_corpus(corpus).save(path)
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -133,6 +144,21 @@ def sample_pagerank(corpus, damping_factor, n):
     return page_count
 
 
+def walk_pagerank(corpus, damping_factor, n, walkers=10000, seed=None):
+    """
+    Return PageRank values for each page by sampling `n` pages with
+    `walkers` random surfers advanced together in NumPy, each starting
+    on a page at random. `seed` makes the result reproducible.
+
+    Return a dictionary where keys are page names, and values are
+    their estimated PageRank value (a value between 0 and 1). All
+    PageRank values should sum to 1.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    ranks = sample_ranks(graph, damping_factor, n, walkers, seed)
+    return graph.rank_dict(ranks)
+
+
 def iterate_pagerank(corpus, damping_factor):
     """
     Return PageRank values for each page by iteratively updating
@@ -193,6 +219,60 @@ def iterate_pagerank(corpus, damping_factor):
             return page_ranks
 
 
+def power_pagerank(corpus, damping_factor, tolerance=1e-10):
+    """
+    Return PageRank values for each page by power iteration over a
+    sparse transition matrix built once from `corpus`, stopping when
+    the L1 norm of the change between iterations is below `tolerance`.
+
+    Unlike `iterate_pagerank`, `corpus` is left unchanged: the rank of
+    pages with no links is spread over all pages each iteration.
+
+    Return a dictionary where keys are page names, and values are
+    their estimated PageRank value (a value between 0 and 1). All
+    PageRank values should sum to 1.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    ranks = power_iteration(TransitionMatrix(graph), damping_factor, tolerance)
+    return graph.rank_dict(ranks)
+
+
+def personalized_pagerank(corpus, damping_factor, seeds, tolerance=1e-10):
+    """
+    Return personalized PageRank values for each page, where the random
+    surfer only ever jumps to (or, from a page with no links, moves to)
+    a page chosen at random from the set `seeds`.
+
+    Return a dictionary where keys are page names, and values are
+    their estimated PageRank value (a value between 0 and 1). All
+    PageRank values should sum to 1.
+    """
+    return batch_personalized_pagerank(corpus, damping_factor, [seeds], tolerance)[0]
+
+
+def batch_personalized_pagerank(corpus, damping_factor, seed_sets, tolerance=1e-10):
+    """
+    Return a list with the personalized PageRank dictionary for each
+    set of seed pages in `seed_sets`, solving all of them at once.
+    Raises ValueError if a seed set is empty or names a page that is not
+    in `corpus`.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    index = {name: i for i, name in enumerate(graph.names)}
+    for column, seeds in enumerate(seed_sets):
+        if not seeds:
+            raise ValueError(f"seed set {column} is empty")
+        for page in seeds:
+            if page not in index:
+                raise ValueError(f"seed set {column} names unknown page {page!r}")
+    ranks = personalized_ranks(
+        TransitionMatrix(graph),
+        [[index[page] for page in seeds] for seeds in seed_sets],
+        damping_factor, tolerance
+    )
+    return [graph.rank_dict(ranks[:, column]) for column in range(len(seed_sets))]
+
+
 def links_to_page(corpus, page):
     """
     Return all pages that link to the given page.
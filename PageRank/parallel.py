@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import row_chunks
+
+# Views onto the shared arrays, set up in each worker by `attach`
+shared = {}
+
+
+def parallel_power_iteration(graph, damping_factor, tolerance=1e-10,
+                             max_iterations=1000, workers=None):
+    """
+    Return the PageRank vector of `graph` by power iteration spread
+    over `workers` processes (default: CPU count).
+
+    The transition matrix is split into blocks of rows, i.e. of pages
+    receiving rank, holding about the same number of links. Rank
+    vectors live in shared memory, double-buffered, so each worker
+    writes its block of the next iteration while reading the current
+    one, and the processes synchronise once per iteration.
+    """
+    workers = workers or os.cpu_count()
+    size = len(graph)
+    out_degree = graph.out_degree()
+    dangling = out_degree == 0
+    inverse_degree = np.zeros(size)
+    inverse_degree[~dangling] = 1 / out_degree[~dangling]
+
+    # Links grouped by target page, for row blocks of the transition matrix
+    sources = np.repeat(np.arange(size, dtype=np.int32), out_degree)
+    order = np.argsort(graph.targets, kind="stable")
+    in_sources = sources[order]
+    in_targets = np.asarray(graph.targets)[order]
+    in_offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(in_targets, minlength=size), out=in_offsets[1:])
+    del sources, order
+
+    arrays = {
+        "in_offsets": in_offsets,
+        "in_sources": in_sources,
+        "in_targets": in_targets,
+        "inverse_degree": inverse_degree,
+        "dangling": dangling,
+        "ranks": np.zeros((2, size)),
+        "weights": np.zeros((2, size)),
+    }
+    blocks = row_chunks(in_offsets, max(1, len(in_sources) // (workers * 4)))
+
+    memory = {}
+    views = {}
+    try:
+        specs = {}
+        for name, values in arrays.items():
+            memory[name] = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+            views[name] = np.ndarray(values.shape, dtype=values.dtype, buffer=memory[name].buf)
+            views[name][...] = values
+            specs[name] = (memory[name].name, values.shape, values.dtype.str)
+        del arrays, in_sources, in_targets
+
+        views["ranks"][0] = 1 / size
+        views["weights"][0] = views["ranks"][0] * inverse_degree
+        dangling_rank = views["ranks"][0][dangling].sum()
+
+        current = 0
+        with multiprocessing.Pool(workers, initializer=attach, initargs=(specs,)) as pool:
+            for _ in range(max_iterations):
+                constant = (damping_factor * dangling_rank + 1 - damping_factor) / size
+                results = pool.map(iterate_block, [
+                    (start, stop, current, damping_factor, constant)
+                    for start, stop in blocks
+                ])
+                current = 1 - current
+                change = sum(result[0] for result in results)
+                dangling_rank = sum(result[1] for result in results)
+                if change < tolerance:
+                    break
+
+        result = views["ranks"][current].copy()
+    finally:
+        views.clear()
+        for block in memory.values():
+            block.close()
+            block.unlink()
+    return result
+
+
+def attach(specs):
+    """
+    Map the shared arrays described by `specs` into this process.
+    """
+    for name, (memory_name, shape, dtype) in specs.items():
+        memory = shared_memory.SharedMemory(name=memory_name)
+        shared[f"{name}_memory"] = memory
+        shared[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def iterate_block(task):
+    """
+    Compute the next ranks of the pages in one row block, writing them
+    to the other half of the shared buffers.
+
+    Return the L1 change over the block and the rank now held by its
+    dangling pages.
+    """
+    start, stop, current, damping_factor, constant = task
+    first, last = shared["in_offsets"][start], shared["in_offsets"][stop]
+    received = np.bincount(
+        shared["in_targets"][first:last] - start,
+        weights=shared["weights"][current][shared["in_sources"][first:last]],
+        minlength=stop - start
+    )
+    new_ranks = damping_factor * received + constant
+
+    change = np.abs(new_ranks - shared["ranks"][current][start:stop]).sum()
+    shared["ranks"][1 - current][start:stop] = new_ranks
+    shared["weights"][1 - current][start:stop] = (
+        new_ranks * shared["inverse_degree"][start:stop]
+    )
+    return change, new_ranks[shared["dangling"][start:stop]].sum()